@@ -0,0 +1,176 @@
+import os
+import struct
+import subprocess
+import tempfile
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# Size a streaming writer puts in the header when it doesn't know the length yet
+WAV_UNKNOWN_SIZE = 0xFFFFFFFF
+# Lowest rate a header may claim; resampling up from less would blow a small
+# upload up into an enormous array
+MIN_WAV_SAMPLE_RATE = 4000
+# (format tag, bits per sample) parsed in-process; other WAV codecs go to ffmpeg
+WAV_SAMPLE_FORMATS = {
+    (WAVE_FORMAT_PCM, 8), (WAVE_FORMAT_PCM, 16), (WAVE_FORMAT_PCM, 32), (WAVE_FORMAT_IEEE_FLOAT, 32),
+}
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+class DecoderUnavailable(Exception):
+    # The server can't decode anything but WAV (ffmpeg is missing): a
+    # deployment problem, not a bad upload
+    pass
+
+
+def decode_audio(data):
+    """Decode an uploaded clip to a mono 16 kHz float32 array without touching disk.
+
+    Plain PCM/float WAV is parsed in-process (16 kHz mono 16-bit, what the
+    recorder uploads, needs no resampling at all); anything else is piped
+    through ffmpeg's stdin/stdout.
+    """
+    if not data:
+        raise AudioDecodeError('Empty audio upload')
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        audio = _decode_wav(data)
+        if audio is not None:
+            return audio
+    return _decode_ffmpeg(data)
+
+
+def _decode_wav(data):
+    # Returns None for WAV codecs we don't handle so ffmpeg can take over
+    fmt = None
+    samples = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from('<I', data, offset + 4)[0]
+        body = data[offset + 8:offset + 8 + chunk_size]
+        if chunk_id == b'fmt ' and len(body) >= 16:
+            fmt = struct.unpack_from('<HHIIHH', body)
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                # The real format tag is the first two bytes of the sub-format GUID
+                fmt = (struct.unpack_from('<H', body, 24)[0],) + fmt[1:]
+        elif chunk_id == b'data':
+            # A streamed header has no real size; the samples run to the end
+            samples = data[offset + 8:] if chunk_size in (0, WAV_UNKNOWN_SIZE) else body
+            break
+        offset += 8 + chunk_size + (chunk_size & 1)
+    if fmt is None or samples is None:
+        return None
+
+    format_tag, channels, sample_rate, _, block_align, bits = fmt
+    if (format_tag, bits) not in WAV_SAMPLE_FORMATS:
+        return None
+    if sample_rate < MIN_WAV_SAMPLE_RATE or channels < 1 or block_align != channels * bits // 8:
+        raise AudioDecodeError(
+            f'Invalid WAV header: {channels} channels, {sample_rate} Hz, {bits}-bit, block align {block_align}'
+        )
+    samples = samples[:len(samples) - len(samples) % block_align]
+    if format_tag == WAVE_FORMAT_PCM and bits == 16:
+        audio = np.frombuffer(samples, '<i2').astype(np.float32) / 32768.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 32:
+        audio = (np.frombuffer(samples, '<i4') / 2147483648.0).astype(np.float32)
+    elif format_tag == WAVE_FORMAT_PCM and bits == 8:
+        audio = (np.frombuffer(samples, np.uint8).astype(np.float32) - 128.0) / 128.0
+    else:
+        audio = np.frombuffer(samples, '<f4').astype(np.float32)
+
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if sample_rate != SAMPLE_RATE:
+        audio = resample(audio, sample_rate)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def finalize_wav(data):
+    # Fill in the RIFF and data sizes of a WAV written with WAV_UNKNOWN_SIZE
+    # placeholders (the recorder's streamed uploads) so saved copies are
+    # readable by anything
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        return data
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from('<I', data, offset + 4)[0]
+        if chunk_id == b'data':
+            if chunk_size not in (0, WAV_UNKNOWN_SIZE):
+                return data
+            data = bytearray(data)
+            struct.pack_into('<I', data, 4, len(data) - 8)
+            struct.pack_into('<I', data, offset + 4, len(data) - offset - 8)
+            return bytes(data)
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return data
+
+
+def resample(audio, orig_sr, target_sr=SAMPLE_RATE):
+    if orig_sr == target_sr or len(audio) == 0:
+        return audio.astype(np.float32)
+    if orig_sr > target_sr:
+        # Windowed-sinc low-pass at the new Nyquist frequency to avoid aliasing
+        cutoff = target_sr / orig_sr / 2
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        audio = np.convolve(audio, kernel / kernel.sum(), mode='same')
+    if orig_sr % target_sr == 0:
+        return audio[::orig_sr // target_sr].astype(np.float32)
+    duration = len(audio) / orig_sr
+    target_times = np.arange(int(duration * target_sr)) / target_sr
+    source_times = np.arange(len(audio)) / orig_sr
+    return np.interp(target_times, source_times, audio).astype(np.float32)
+
+
+def _ffmpeg_command(source):
+    return [
+        'ffmpeg', '-nostdin', '-threads', '0',
+        '-i', source,
+        '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE),
+        '-loglevel', 'error',
+        'pipe:1',
+    ]
+
+
+def _decode_ffmpeg(data):
+    try:
+        proc = subprocess.run(_ffmpeg_command('pipe:0'), input=data, capture_output=True)
+    except FileNotFoundError:
+        raise DecoderUnavailable('ffmpeg is not installed') from None
+    if proc.returncode != 0 or not proc.stdout:
+        # Non-fragmented MP4/M4A keeps its index at the end of the file and
+        # can't be demuxed from a pipe, so those still need a seekable file.
+        proc = _decode_ffmpeg_seekable(data)
+    if proc.returncode != 0:
+        raise AudioDecodeError(f"Failed to decode audio: {proc.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(proc.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def _decode_ffmpeg_seekable(data):
+    fd, path = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return subprocess.run(_ffmpeg_command(path), capture_output=True)
+    finally:
+        os.unlink(path)
+
+
+def warmup_clip(seconds=2.0, seed=0):
+    # Voice-like harmonics under an amplitude envelope plus a little noise;
+    # enough to push real work through the mel, encoder and decoder
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6))
+    envelope = 0.5 * (1 - np.cos(2 * np.pi * 3 * t))
+    audio = 0.1 * voice * envelope + 0.005 * rng.standard_normal(len(t))
+    return audio.astype(np.float32)
@@ -0,0 +1,210 @@
+import copy
+import itertools
+import os
+import time
+from collections import namedtuple
+
+import torch
+import whisper
+from whisper.audio import N_SAMPLES
+
+# Which backend and Whisper checkpoint to load at startup
+BACKEND = os.environ.get('VOICEQUOTE_BACKEND', 'whisper')
+MODEL_NAME = os.environ.get('VOICEQUOTE_MODEL', 'small')
+
+# Same thresholds model.transcribe() uses to decide a decode needs a retry
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# How clips are decoded; picked per request, VOICEQUOTE_DECODING_PROFILE otherwise.
+#   fallback:   retry low-confidence clips with model.transcribe()'s temperature cascade
+#   sample_len: most tokens decoded per clip (None: Whisper's default of half the context)
+#   prompt:     text the decoder is conditioned on, as if it came just before the clip
+DecodingProfile = namedtuple('DecodingProfile', 'fallback sample_len prompt')
+
+# The desk's vocabulary, in the spoken forms quote_parser.BOND_MAPPINGS expects.
+# Words only: a prompt with numbers or whole quotes gets copied into the
+# transcript of a clip the model can't make out, and parses as a real quote.
+QUOTE_PROMPT = (
+    "OAT, BTP, Bund, DBR, Spain, SPGB, Portugal, PGB, Belgium, BGB, Austria, RAGB, "
+    "Netherlands, Finland, RFGB; bid, offer, pick, give, against."
+)
+QUOTE_SAMPLE_LEN = int(os.environ.get('VOICEQUOTE_QUOTE_SAMPLE_LEN', 48))
+
+DECODING_PROFILES = {
+    'default': DecodingProfile(fallback=True, sample_len=None, prompt=None),
+    # Short single-utterance quotes: one greedy pass, no retries, short output
+    'quote': DecodingProfile(fallback=False, sample_len=QUOTE_SAMPLE_LEN, prompt=QUOTE_PROMPT),
+}
+DECODING_PROFILE = os.environ.get('VOICEQUOTE_DECODING_PROFILE', 'default')
+if DECODING_PROFILE not in DECODING_PROFILES:
+    raise ValueError(
+        f"Unknown VOICEQUOTE_DECODING_PROFILE {DECODING_PROFILE!r}, "
+        f"expected one of: {', '.join(sorted(DECODING_PROFILES))}"
+    )
+
+
+class TranscriptionBackend:
+    """Interface the inference queue drives.
+
+    transcribe_batch() takes a list of mono 16 kHz float32 arrays and the name
+    of a DECODING_PROFILES entry (None for DECODING_PROFILE), and returns one
+    model.transcribe()-style result dict (at least {'text': ...}) per clip.
+    Results may carry a 'timings' dict of stage name -> seconds.
+
+    replicate() returns another instance that can transcribe concurrently
+    with this one, for the inference queue's replica threads.
+    """
+
+    name = None
+
+    def transcribe_batch(self, clips, profile=None):
+        raise NotImplementedError
+
+    def memory_bytes(self):
+        return 0
+
+    def replicate(self):
+        raise NotImplementedError(f'{type(self).__name__} does not support replicas')
+
+    def set_num_threads(self, threads):
+        # Called on the replica's own inference thread
+        pass
+
+
+class WhisperBackend(TranscriptionBackend):
+    """Stock openai-whisper in full precision."""
+
+    name = 'whisper'
+
+    def __init__(self, model_name=MODEL_NAME):
+        self.model_name = model_name
+        self.model = self.load_model(model_name)
+
+    def load_model(self, model_name):
+        return whisper.load_model(model_name)
+
+    def memory_bytes(self):
+        # state_dict() rather than parameters() so quantized packed weights count too
+        total = 0
+        for value in self.model.state_dict().values():
+            for tensor in (value if isinstance(value, tuple) else (value,)):
+                if isinstance(tensor, torch.Tensor):
+                    total += tensor.numel() * tensor.element_size()
+        return total
+
+    def replicate(self):
+        # whisper.decode() installs kv-cache hooks on the model's modules, so
+        # two threads can't decode with one model object. They can share its
+        # weights though: copy the module tree but map every tensor (and
+        # quantized packed weights) to itself, so a replica costs no memory.
+        model = self.model
+        shared = itertools.chain(
+            model.parameters(),
+            model.buffers(),
+            (module for module in model.modules() if type(module).__name__.endswith('PackedParams')),
+        )
+        replica = copy.copy(self)
+        replica.model = copy.deepcopy(model, {id(item): item for item in shared})
+        return replica
+
+    def set_num_threads(self, threads):
+        # Intra-op threads for torch calls made from this thread
+        torch.set_num_threads(threads)
+
+    def transcribe_batch(self, clips, profile=None):
+        profile = DECODING_PROFILES[profile or DECODING_PROFILE]
+        results = [None] * len(clips)
+        short = [i for i, audio in enumerate(clips) if len(audio) <= N_SAMPLES]
+        if short:
+            for i, result in zip(short, self._decode_batch([clips[i] for i in short], profile)):
+                results[i] = result
+        # Anything longer than one window goes through the sliding-window path
+        for i, audio in enumerate(clips):
+            if results[i] is None:
+                start = time.perf_counter()
+                results[i] = self._transcribe_long(audio, profile)
+                results[i]['timings'] = {'transcribe': time.perf_counter() - start}
+        return results
+
+    def _transcribe_long(self, audio, profile):
+        if profile.fallback:
+            return self.model.transcribe(audio, language="en", initial_prompt=profile.prompt)
+        # A single temperature means no fallback cascade; each window is
+        # decoded on its own rather than conditioned on the previous one
+        return self.model.transcribe(
+            audio, language="en", temperature=0.0, condition_on_previous_text=False,
+            initial_prompt=profile.prompt,
+        )
+
+    def _decode_batch(self, clips, profile):
+        # Clips that fit in one 30 s window share a single encoder/decoder pass.
+        # Stage times are for the whole batch, which every clip in it waited on.
+        model = self.model
+        timings = {}
+        start = time.perf_counter()
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=model.dims.n_mels)
+            for audio in clips
+        ]).to(model.device)
+        options = whisper.DecodingOptions(
+            language="en",
+            without_timestamps=True,
+            sample_len=profile.sample_len,
+            prompt=profile.prompt,
+            fp16=model.device.type == 'cuda',
+        )
+        if options.fp16:
+            mel = mel.half()
+        timings['mel'] = time.perf_counter() - start
+        with torch.no_grad():
+            start = time.perf_counter()
+            # whisper.decode() skips its own encoder pass when handed features
+            audio_features = model.encoder(mel)
+            timings['encoder'] = time.perf_counter() - start
+            start = time.perf_counter()
+            decoded = whisper.decode(model, audio_features, options)
+            timings['decoder'] = time.perf_counter() - start
+        results = []
+        for audio, result in zip(clips, decoded):
+            clip_timings = dict(timings)
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                text = ''
+            elif profile.fallback and (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+                                       or result.avg_logprob < LOGPROB_THRESHOLD):
+                # Low-confidence greedy decode: fall back to the full
+                # temperature cascade for this clip only
+                start = time.perf_counter()
+                text = model.transcribe(audio, language="en", initial_prompt=profile.prompt)['text']
+                clip_timings['fallback'] = time.perf_counter() - start
+            else:
+                text = result.text
+            results.append({'text': text, 'timings': clip_timings})
+        return results
+
+
+class QuantizedWhisperBackend(WhisperBackend):
+    """Whisper with its Linear layers dynamically quantized to int8 (CPU only)."""
+
+    name = 'whisper-int8'
+
+    def load_model(self, model_name):
+        model = whisper.load_model(model_name, device='cpu')
+        # whisper.model.Linear only overrides forward() to cast weights to the
+        # input dtype; quantize_dynamic matches on exact type, so turn those
+        # layers back into plain nn.Linear first.
+        for module in model.modules():
+            if isinstance(module, torch.nn.Linear):
+                module.__class__ = torch.nn.Linear
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+BACKENDS = {backend.name: backend for backend in (WhisperBackend, QuantizedWhisperBackend)}
+
+
+def load_backend(name=None, model_name=None):
+    name = name or BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of: {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[name](model_name or MODEL_NAME)
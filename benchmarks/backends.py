@@ -0,0 +1,143 @@
+"""Compare transcription backends on a set of sample clips.
+
+    python -m benchmarks.backends training_audio/
+    python -m benchmarks.backends --backends whisper,whisper-int8 --model small a.wav b.mp3
+    python -m benchmarks.backends --backends whisper --profiles default,quote training_audio/
+
+Each backend runs in its own process so load time and peak RSS are measured
+in isolation. With --profiles every backend runs once per decoding profile.
+Transcripts and parse_quote results are compared against the first
+backend/profile listed. Clips go through vad.trim_silence first, as on the
+server, and the timings include it; set VOICEQUOTE_VAD=0 to compare on
+untrimmed audio.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import re
+import statistics
+import sys
+import time
+
+from benchmarks.stats import percentile
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.webm', '.ogg', '.m4a', '.mp4', '.flac')
+
+
+def find_clips(paths):
+    clips = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                clips.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            clips.append(path)
+    return clips
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_backend(name, model_name, clips, profile=None):
+    from audio import decode_audio
+    from backends import load_backend
+    from quote_parser import parse_quote
+    from vad import trim_silence
+
+    audio = []
+    for path in clips:
+        with open(path, 'rb') as f:
+            audio.append(decode_audio(f.read()))
+
+    start = time.perf_counter()
+    backend = load_backend(name, model_name)
+    load_seconds = time.perf_counter() - start
+
+    # Warm up on the first clip so one-off allocation isn't counted
+    backend.transcribe_batch(audio[:1], profile)
+    latencies = []
+    texts = []
+    for clip in audio:
+        start = time.perf_counter()
+        speech = trim_silence(clip)
+        # Like the server, a clip with no speech never reaches the model
+        text = backend.transcribe_batch([speech], profile)[0]['text'] if len(speech) else ''
+        latencies.append(time.perf_counter() - start)
+        texts.append(text)
+    return {
+        'backend': f'{name}/{profile}' if profile else name,
+        'load_seconds': load_seconds,
+        'peak_rss_mb': peak_rss_mb(),
+        'latencies': latencies,
+        'texts': texts,
+        'quotes': [parse_quote(text, return_pattern=True)[0] for text in texts],
+    }
+
+
+def normalize_words(text):
+    return re.sub(r"[^a-z0-9/' ]", ' ', text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    from bond_resolver import edit_distance
+    ref = normalize_words(reference)
+    hyp = normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    return edit_distance(ref, hyp) / len(ref)
+
+
+def report(results):
+    reference = results[0]
+    print(f"{'backend':<20} {'load s':>7} {'rss MB':>8} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'WER':>6} {'text eq':>7} {'quote eq':>8}")
+    for result in results:
+        latencies = [t * 1000 for t in result['latencies']]
+        n = len(result['texts'])
+        wer = statistics.mean(word_error_rate(a, b) for a, b in zip(reference['texts'], result['texts']))
+        same_text = sum(normalize_words(a) == normalize_words(b) for a, b in zip(reference['texts'], result['texts']))
+        same_quote = sum(a == b for a, b in zip(reference['quotes'], result['quotes']))
+        print(f"{result['backend']:<20} {result['load_seconds']:>7.1f} {result['peak_rss_mb']:>8.0f} "
+              f"{statistics.mean(latencies):>8.0f} {percentile(latencies, 50):>7.0f} {percentile(latencies, 95):>7.0f} "
+              f"{wer:>6.3f} {same_text / n:>7.0%} {same_quote / n:>8.0%}")
+
+
+def main():
+    from backends import BACKENDS, DECODING_PROFILES, MODEL_NAME
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='audio files or directories of them')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='comma-separated, reference first')
+    parser.add_argument('--model', default=MODEL_NAME, help='Whisper checkpoint name')
+    parser.add_argument('--profiles', help='comma-separated decoding profiles (default: VOICEQUOTE_DECODING_PROFILE)')
+    args = parser.parse_args()
+
+    clips = find_clips(args.paths)
+    if not clips:
+        parser.error('no audio clips found')
+    names = [name.strip() for name in args.backends.split(',') if name.strip()]
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown backend(s): {', '.join(unknown)}")
+    profiles = [p.strip() for p in (args.profiles or '').split(',') if p.strip()] or [None]
+    unknown = [p for p in profiles if p is not None and p not in DECODING_PROFILES]
+    if unknown:
+        parser.error(f"unknown decoding profile(s): {', '.join(unknown)}")
+
+    # A fresh process per backend keeps RSS numbers independent
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in names:
+        for profile in profiles:
+            with context.Pool(1) as pool:
+                results.append(pool.apply(run_backend, (name, args.model, clips, profile)))
+    print(f"{len(clips)} clips, model {args.model}")
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""Load test /transcribe through the real gunicorn config.
+
+    python -m benchmarks.load
+    python -m benchmarks.load --concurrency 8 --requests 400 --workers 2 --threads 4
+    python -m benchmarks.load --model base --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load --baseline benchmarks/baseline.json
+    python -m benchmarks.load --url http://localhost:10000 --concurrency 2
+    python -m benchmarks.load --profile quote --baseline benchmarks/baseline.json
+
+Quote clips are synthesised offline from a fixed seed: the quote text comes
+from templates covering the parser's patterns, is spoken by espeak-ng (or
+espeak) when installed, and is padded with seeded silence and noise. Without
+a TTS engine the clips are speech-shaped noise, fine for throughput and
+latency but not for the quote hit rate.
+
+Unless --url is given, gunicorn is started with gunicorn_config.py on a
+spare local port (--workers, --threads, --model, --backend and --env
+override its settings) and stopped afterwards. Throughput, end-to-end
+latency and the per-stage timings each response reports are summarised as
+p50/p95/p99; --baseline compares them against a saved run and exits 1 if
+anything is worse by more than --tolerance (and --min-delta).
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import wave
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.stats import compare_to_baseline, save_baseline, summarize
+
+SAMPLE_RATE = 16000
+
+BOND_WORDS = ['OAT', 'BTP', 'Bund', 'Spain', 'Portugal', 'Belgium', 'Austria', 'Netherlands', 'Finland']
+MONTH_WORDS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August',
+               'September', 'October', 'November', 'December']
+TEMPLATES = [
+    "{bond} {month_number}/{year} {side} {size}",
+    "{bond} {month} {year} {price} {side} {size} million",
+    "{bond} {month} {year}, I'm {price} {side} in {size} million",
+    "I can {action} {size} million of {bond} {month} {year} at {price}",
+    "I can {action} {size} million of {bond} {month} {year}",
+    "{bond} {month} {year}, I can {action} {size} million",
+]
+
+
+def quote_text(rng):
+    month = rng.randrange(12)
+    return rng.choice(TEMPLATES).format(
+        bond=rng.choice(BOND_WORDS),
+        month=MONTH_WORDS[month],
+        month_number=month + 1,
+        year=rng.randint(25, 55),
+        side=rng.choice(['bid', 'offer']),
+        action=rng.choice(['buy', 'sell']),
+        price=rng.randint(1, 99),
+        size=rng.choice([5, 10, 15, 20, 25, 50, 100]),
+    )
+
+
+def find_tts():
+    return shutil.which('espeak-ng') or shutil.which('espeak')
+
+
+def speak(tts, text):
+    from audio import decode_audio
+    with tempfile.NamedTemporaryFile(suffix='.wav') as f:
+        subprocess.run([tts, '-v', 'en', '-s', '165', '-w', f.name, text], check=True, capture_output=True)
+        return decode_audio(f.read())
+
+
+def speech_shaped_noise(rng, seconds):
+    # Stand-in when there's no TTS: harmonics under a syllable-rate envelope
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = rng.uniform(100, 220)
+    voice = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0, None)
+    return (0.1 * voice * envelope).astype(np.float32)
+
+
+def to_wav(audio):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes((np.clip(audio, -1, 1) * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def synthesize_clips(count, seed, tts):
+    """(text, wav bytes) pairs; the same seed always gives the same clips."""
+    rng = random.Random(seed)
+    noise = np.random.default_rng(seed)
+    clips = []
+    for _ in range(count):
+        text = quote_text(rng)
+        speech = speak(tts, text) if tts else speech_shaped_noise(rng, rng.uniform(1.5, 3.0))
+        # Silence either side like a real push-to-talk clip, plus a little desk noise
+        lead, tail = (np.zeros(int(rng.uniform(0.2, 1.0) * SAMPLE_RATE), np.float32) for _ in range(2))
+        audio = np.concatenate([lead, speech, tail])
+        audio += 0.003 * noise.standard_normal(len(audio)).astype(np.float32)
+        clips.append((text, to_wav(audio)))
+    return clips
+
+
+def multipart(data, filename='clip.wav'):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: audio/wav\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def post_clip(url, data, profile=None):
+    body, content_type = multipart(data)
+    path = '/transcribe' + (f'?profile={urllib.parse.quote(profile)}' if profile else '')
+    req = urllib.request.Request(url + path, data=body, headers={'Content-Type': content_type})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=300) as response:
+            status, payload = response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        status, payload = e.code, {}
+    except (urllib.error.URLError, OSError) as e:
+        status, payload = None, {'error': str(e)}
+    return status, time.perf_counter() - start, payload
+
+
+def run_load(url, clips, requests, concurrency, first=0, profile=None):
+    results = []
+    lock = threading.Lock()
+    counter = iter(range(first, first + requests))
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            text, data = clips[i % len(clips)]
+            status, seconds, payload = post_clip(url, data, profile)
+            with lock:
+                results.append((text, status, seconds, payload))
+
+    threads = [threading.Thread(target=client) for _ in range(min(concurrency, requests))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(args):
+    port = free_port()
+    env = dict(os.environ)
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+    if args.model:
+        env['VOICEQUOTE_MODEL'] = args.model
+    if args.backend:
+        env['VOICEQUOTE_BACKEND'] = args.backend
+    for setting in args.env:
+        key, _, value = setting.partition('=')
+        env[key] = value
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', '--bind', f'127.0.0.1:{port}']
+    if args.threads:
+        command += ['--threads', str(args.threads)]
+    server = subprocess.Popen(command + ['main:app'], env=env)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f'gunicorn exited with status {server.returncode}')
+        try:
+            with urllib.request.urlopen(url + '/ready', timeout=5) as response:
+                if response.status == 200:
+                    return server, url
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(1)
+    server.terminate()
+    sys.exit(f'gunicorn not ready after {args.startup_timeout:.0f}s')
+
+
+def report(results, wall, tts):
+    from quote_parser import parse_quote
+
+    ok = [r for r in results if r[1] == 200]
+    shed = sum(r[1] == 503 for r in results)
+    failed = len(results) - len(ok) - shed
+    print(f"\n{len(results)} requests: {len(ok)} ok, {shed} shed (503), {failed} failed in {wall:.1f}s")
+    metrics = {'throughput_rps': len(ok) / wall if wall else 0.0}
+    if not ok:
+        return metrics
+
+    stages = defaultdict(list)
+    for _, _, seconds, payload in ok:
+        stages['total'].append(seconds * 1000)
+        for stage, ms in payload.get('timings', {}).items():
+            stages[stage].append(ms)
+    print(f"Throughput: {metrics['throughput_rps']:.2f} req/s")
+    print(f"\n{'stage (ms)':<12} {'n':>6} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    # Client-side total first, then server stages in pipeline order
+    order = ['total', 'upload', 'decode', 'vad', 'queue', 'mel', 'encoder', 'decoder', 'fallback',
+             'transcribe', 'parse', 'serialize']
+    for stage in sorted(stages, key=lambda s: (order.index(s) if s in order else len(order), s)):
+        summary = summarize(stages[stage])
+        print(f"{stage:<12} {len(stages[stage]):>6} {summary['mean']:>8.1f} {summary['p50']:>8.1f} "
+              f"{summary['p95']:>8.1f} {summary['p99']:>8.1f}")
+        for name in ('p50', 'p95', 'p99'):
+            metrics[f'{stage}_{name}_ms'] = summary[name]
+
+    if tts:
+        hits = sum(payload.get('quote') == parse_quote(text) for text, _, _, payload in ok)
+        metrics['quote_hit_rate'] = hits / len(ok)
+        print(f"\nQuote hit rate: {hits}/{len(ok)} = {metrics['quote_hit_rate']:.1%} "
+              "(same quote as parsing the spoken text)")
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='existing server to load instead of starting gunicorn')
+    parser.add_argument('--concurrency', type=int, default=4, help='simultaneous clients')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests')
+    parser.add_argument('--warmup', type=int, help='untimed requests first (default 2 x concurrency)')
+    parser.add_argument('--clips', type=int, default=50, help='distinct clips to synthesise')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help='gunicorn workers (WEB_CONCURRENCY)')
+    parser.add_argument('--threads', type=int, help='gunicorn threads per worker')
+    parser.add_argument('--model', help='Whisper checkpoint (VOICEQUOTE_MODEL)')
+    parser.add_argument('--backend', help='transcription backend (VOICEQUOTE_BACKEND)')
+    parser.add_argument('--profile', help="decoding profile sent with each request, e.g. 'quote'")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for gunicorn, repeatable')
+    parser.add_argument('--startup-timeout', type=float, default=600, help='seconds to wait for /ready')
+    parser.add_argument('--baseline', help='compare against this saved run')
+    parser.add_argument('--save-baseline', metavar='PATH', help='save this run as a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    parser.add_argument('--min-delta', type=float, default=2.0,
+                        help='ignore changes smaller than this many ms (or req/s)')
+    args = parser.parse_args()
+    warmup = 2 * args.concurrency if args.warmup is None else args.warmup
+
+    tts = find_tts()
+    print(f"Synthesising {args.clips} clips (seed {args.seed}, "
+          f"{os.path.basename(tts) if tts else 'no TTS found, speech-shaped noise'})...")
+    clips = synthesize_clips(args.clips, args.seed, tts)
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_gunicorn(args)
+    try:
+        print(f"Sending {args.requests} requests (+{warmup} warmup) at concurrency {args.concurrency} to {url}")
+        url = url.rstrip('/')
+        run_load(url, clips, warmup, args.concurrency, profile=args.profile)
+        results, wall = run_load(url, clips, args.requests, args.concurrency, first=warmup, profile=args.profile)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    metrics = report(results, wall, tts)
+    config = {
+        'concurrency': args.concurrency, 'requests': args.requests, 'clips': args.clips, 'seed': args.seed,
+        'workers': args.workers, 'threads': args.threads, 'model': args.model, 'backend': args.backend,
+        'profile': args.profile,
+        'env': sorted(args.env), 'url': args.url, 'tts': os.path.basename(tts) if tts else None,
+    }
+    if args.save_baseline:
+        save_baseline(args.save_baseline, metrics, config)
+        print(f"\nSaved baseline to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, metrics, config, args.tolerance, args.min_delta)
+        if regressions:
+            sys.exit(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
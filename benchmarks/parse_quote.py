@@ -0,0 +1,111 @@
+"""Microbenchmark for quote_parser.parse_quote.
+
+    python -m benchmarks.parse_quote
+    python -m benchmarks.parse_quote --corpus training_data.csv --repeat 20
+    python -m benchmarks.parse_quote --feedback-db feedback.db --baseline benchmarks/parse_baseline.json
+
+With --corpus, transcripts are read from the second column of a
+training_data.csv / corrections.csv style file, and with --feedback-db from
+every saved sample in the feedback store; otherwise a built-in set of
+representative transcripts (one per pattern plus a few misses) is used.
+--save-baseline/--baseline store and compare results like benchmarks.load.
+"""
+import argparse
+import csv
+import sys
+import time
+
+from benchmarks.stats import compare_to_baseline, percentile, save_baseline
+from quote_parser import parse_quote
+
+SAMPLE_TRANSCRIPTS = [
+    " OAT 5/55 bid 10 at 98",
+    " 10/31 Bund offer 25",
+    " I can buy bund May 30 against BTP June 31, pick 5 in 10 million",
+    " OAT May 55 12 offer 72 million",
+    " OAT May 55, I'm 7 offer in 12 million",
+    " BTP September 17, 12 offer in 40 million",
+    " I can sell 30 million of bond September 72 at 79",
+    " I can buy 72 million of bund October 71",
+    " Bund October 71, I can buy 72 million",
+    " Thank you for watching.",
+    " Can you hear me now? Let me check the screens first.",
+]
+
+
+def load_corpus(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row[1] for row in csv.reader(f) if len(row) > 1 and row[1]]
+
+
+def load_feedback(path):
+    from feedback_store import KINDS, FeedbackStore
+    store = FeedbackStore(path)
+    return [row['transcription'] for kind in KINDS for row in store.find(kind) if row['transcription']]
+
+
+def per_call_us(transcripts):
+    # Separate pass timing each call, for the tail; perf_counter_ns overhead
+    # is small next to a call
+    times = []
+    for text in transcripts:
+        start = time.perf_counter_ns()
+        parse_quote(text, return_pattern=True)
+        times.append((time.perf_counter_ns() - start) / 1000)
+    return times
+
+
+def run(transcripts, repeat):
+    # One untimed pass so first-call costs don't skew the numbers
+    for text in transcripts:
+        parse_quote(text, return_pattern=True)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in transcripts:
+            parse_quote(text, return_pattern=True)
+    elapsed = time.perf_counter() - start
+    return elapsed, repeat * len(transcripts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='CSV file with transcripts in the second column')
+    parser.add_argument('--feedback-db', help='use every transcript saved in this feedback store')
+    parser.add_argument('--repeat', type=int, default=2000, help='passes over the corpus')
+    parser.add_argument('--baseline', help='compare against this saved run')
+    parser.add_argument('--save-baseline', metavar='PATH', help='save this run as a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    args = parser.parse_args()
+
+    if args.corpus:
+        transcripts = load_corpus(args.corpus)
+    elif args.feedback_db:
+        transcripts = load_feedback(args.feedback_db)
+    else:
+        transcripts = SAMPLE_TRANSCRIPTS
+    if not transcripts:
+        parser.error('corpus is empty')
+    elapsed, calls = run(transcripts, args.repeat)
+    print(f"{calls} calls over {len(transcripts)} transcripts in {elapsed:.3f}s")
+    print(f"{elapsed / calls * 1e6:.2f} us/call, {calls / elapsed:,.0f} calls/s")
+    times = per_call_us(transcripts * max(1, min(args.repeat, 100_000 // len(transcripts))))
+    print(f"per call: p50 {percentile(times, 50):.2f} us  p95 {percentile(times, 95):.2f} us  "
+          f"p99 {percentile(times, 99):.2f} us")
+
+    metrics = {
+        'parse_us_per_call': elapsed / calls * 1e6,
+        'parse_p50_us': percentile(times, 50),
+        'parse_p99_us': percentile(times, 99),
+    }
+    config = {'corpus': args.corpus or args.feedback_db or 'built-in', 'transcripts': len(transcripts)}
+    if args.save_baseline:
+        save_baseline(args.save_baseline, metrics, config)
+        print(f"Saved baseline to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, metrics, config, args.tolerance)
+        if regressions:
+            sys.exit(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
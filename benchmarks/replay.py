@@ -0,0 +1,238 @@
+"""Replay the labelled corpus through transcription and parse_quote.
+
+    python -m benchmarks.replay
+    python -m benchmarks.replay --workers 8 --backend whisper-int8
+    python -m benchmarks.replay --profile quote
+    python -m benchmarks.replay --legacy-csv --show-failures 20
+
+Samples come from the feedback store (training rows expect `quote`,
+corrections expect `correct_quote`), or with --legacy-csv from
+training_data.csv / corrections.csv and their flat audio directories.
+
+Clips are trimmed by vad.trim_silence first, as the server does (set
+VOICEQUOTE_VAD=0 to replay untrimmed audio), and a clip with no speech is
+never sent to the model. Transcripts are cached by audio hash, backend,
+model, decoding profile and VAD settings, so after a parser or BOND_MAPPINGS
+change only parse_quote runs again. Cache misses are transcribed across a
+process pool with one model per worker.
+--saved-transcripts skips the model entirely and re-parses the transcripts
+stored with each sample.
+"""
+import argparse
+import csv
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from benchmarks.stats import percentile
+from feedback_store import AUDIO_DIRS, FEEDBACK_DB, KINDS, FeedbackStore
+from quote_parser import parse_quote
+from vad import VAD_SETTINGS
+
+Sample = namedtuple('Sample', 'kind audio_filename audio_path transcription expected pattern')
+
+EXPECTED_COLUMN = {'training': 'quote', 'corrections': 'correct_quote'}
+LEGACY_CSVS = {'training': 'training_data.csv', 'corrections': 'corrections.csv'}
+
+
+def load_samples(store, legacy_csv=False):
+    samples = []
+    if legacy_csv:
+        for kind, path in LEGACY_CSVS.items():
+            if not os.path.exists(path):
+                continue
+            with open(path, newline='', encoding='utf-8') as f:
+                for values in csv.reader(f):
+                    if len(values) != len(KINDS[kind]):
+                        continue
+                    row = dict(zip(KINDS[kind], values))
+                    samples.append(Sample(
+                        kind, row['audio_filename'], os.path.join(AUDIO_DIRS[kind], row['audio_filename']),
+                        row['transcription'], row[EXPECTED_COLUMN[kind]], row['pattern'],
+                    ))
+    else:
+        for kind in KINDS:
+            for row in store.find(kind):
+                samples.append(Sample(
+                    kind, row['audio_filename'], store.audio_path(kind, row['audio_filename']),
+                    row['transcription'], row[EXPECTED_COLUMN[kind]], row['pattern'],
+                ))
+    return samples
+
+
+class TranscriptCache:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts (key TEXT PRIMARY KEY, text TEXT NOT NULL, seconds REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        row = self.conn.execute("SELECT text FROM transcripts WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, text, seconds):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?)", (key, text, seconds))
+
+
+# Per-process state for pool workers
+_backend = None
+_profile = None
+
+
+def _init_worker(backend_name, model_name, profile, threads):
+    global _backend, _profile
+    import torch
+    from backends import load_backend
+    # Pool workers split the cores between them instead of each using all of them
+    torch.set_num_threads(threads)
+    _backend = load_backend(backend_name, model_name)
+    _profile = profile
+
+
+def _transcribe(path):
+    from audio import decode_audio
+    from vad import trim_silence
+    with open(path, 'rb') as f:
+        audio = decode_audio(f.read())
+    # Timed from the trim, the part of the served pipeline after decoding
+    start = time.perf_counter()
+    speech = trim_silence(audio)
+    text = _backend.transcribe_batch([speech], _profile)[0]['text'] if len(speech) else ''
+    return text, time.perf_counter() - start
+
+
+def transcribe_all(samples, keys, cache, args):
+    texts = {}
+    missing = {}
+    for sample, key in zip(samples, keys):
+        if key is None:
+            continue
+        text = cache.get(key) if cache else None
+        if text is not None:
+            texts[key] = text
+        else:
+            missing.setdefault(key, sample.audio_path)
+
+    latencies = []
+    wall = 0.0
+    if missing:
+        workers = max(1, min(args.workers, len(missing)))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        print(f"Transcribing {len(missing)} clips on {workers} workers ({threads} threads each)...")
+        start = time.perf_counter()
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(args.backend, args.model, args.profile, threads)) as pool:
+            futures = {pool.submit(_transcribe, path): key for key, path in missing.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                text, seconds = future.result()
+                texts[key] = text
+                latencies.append(seconds)
+                if cache:
+                    cache.put(key, text, seconds)
+        wall = time.perf_counter() - start
+    return texts, latencies, wall
+
+
+def audio_key(path, backend_name, model_name, profile, vad=VAD_SETTINGS):
+    try:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+    return f"{backend_name}:{model_name}:{profile}:{vad}:{digest}"
+
+
+def report(samples, keys, texts, latencies, wall, show_failures):
+    by_pattern = defaultdict(Counter)
+    matched = Counter()
+    failures = []
+    missing_audio = 0
+    start = time.perf_counter()
+    for sample, key in zip(samples, keys):
+        if key is None:
+            missing_audio += 1
+            continue
+        quote, pattern_name = parse_quote(texts[key], return_pattern=True)
+        correct = quote == sample.expected
+        by_pattern[sample.pattern]['total'] += 1
+        by_pattern[sample.pattern]['correct'] += correct
+        matched[pattern_name or 'none'] += 1
+        if not correct:
+            failures.append((sample, texts[key], quote))
+    parse_seconds = time.perf_counter() - start
+
+    total = sum(c['total'] for c in by_pattern.values())
+    correct = sum(c['correct'] for c in by_pattern.values())
+    print(f"\n{total} samples replayed, {missing_audio} skipped (audio missing)")
+    if total:
+        print(f"Overall accuracy: {correct}/{total} = {correct / total:.1%}")
+    print(f"\n{'labelled pattern':<24} {'n':>6} {'correct':>8} {'accuracy':>9}")
+    for pattern, counts in sorted(by_pattern.items()):
+        print(f"{pattern:<24} {counts['total']:>6} {counts['correct']:>8} {counts['correct'] / counts['total']:>9.1%}")
+    print(f"\n{'matched pattern':<24} {'n':>6}")
+    for pattern, count in matched.most_common():
+        print(f"{pattern:<24} {count:>6}")
+
+    if latencies:
+        ms = [t * 1000 for t in latencies]
+        print(f"\nTranscribed {len(latencies)} clips in {wall:.1f}s: {len(latencies) / wall:.2f} clips/s")
+        print(f"Latency ms: mean {statistics.mean(ms):.0f}  p50 {percentile(ms, 50):.0f}  "
+              f"p95 {percentile(ms, 95):.0f}  p99 {percentile(ms, 99):.0f}")
+    else:
+        print("\nNo clips transcribed (all cached or saved transcripts)")
+    if total:
+        print(f"parse_quote: {parse_seconds / total * 1e6:.1f} us/sample")
+
+    for sample, text, quote in failures[:show_failures]:
+        print(f"\n{sample.audio_filename} [{sample.pattern}]\n  heard:    {text.strip()}\n"
+              f"  expected: {sample.expected}\n  got:      {quote}")
+
+
+def main():
+    from backends import BACKEND, DECODING_PROFILE, DECODING_PROFILES, MODEL_NAME
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=FEEDBACK_DB, help='feedback store to replay')
+    parser.add_argument('--legacy-csv', action='store_true', help='read the old CSV files instead of the store')
+    parser.add_argument('--backend', default=BACKEND)
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--profile', default=DECODING_PROFILE, choices=sorted(DECODING_PROFILES),
+                        help='decoding profile')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='model processes')
+    parser.add_argument('--cache', default='replay_cache.db', help='transcript cache file')
+    parser.add_argument('--no-cache', action='store_true', help='ignore and don\'t update the cache')
+    parser.add_argument('--saved-transcripts', action='store_true',
+                        help='re-parse the stored transcripts instead of transcribing the audio')
+    parser.add_argument('--pattern', help='only replay samples labelled with this pattern')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--show-failures', type=int, default=0, metavar='N')
+    args = parser.parse_args()
+
+    samples = load_samples(None if args.legacy_csv else FeedbackStore(args.db), args.legacy_csv)
+    if args.pattern:
+        samples = [s for s in samples if s.pattern == args.pattern]
+    samples = samples[:args.limit]
+    if not samples:
+        parser.error('no samples to replay')
+
+    if args.saved_transcripts:
+        keys = list(range(len(samples)))
+        texts = {i: s.transcription for i, s in enumerate(samples)}
+        latencies, wall = [], 0.0
+    else:
+        keys = [audio_key(s.audio_path, args.backend, args.model, args.profile) for s in samples]
+        cache = None if args.no_cache else TranscriptCache(args.cache)
+        texts, latencies, wall = transcribe_all(samples, keys, cache, args)
+    report(samples, keys, texts, latencies, wall, args.show_failures)
+
+
+if __name__ == '__main__':
+    main()
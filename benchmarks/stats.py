@@ -0,0 +1,59 @@
+import json
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile; good enough for latency reporting
+    ordered = sorted(values)
+    if not ordered:
+        return float('nan')
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    # Latency summary in the same units as the input
+    if not values:
+        return {}
+    return {
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+    }
+
+
+# Metrics whose name ends in one of these get better as they go up; anything
+# else (latencies, us/call) gets better as it goes down
+HIGHER_IS_BETTER = ('_rps', '_per_s', 'hit_rate')
+
+
+def save_baseline(path, metrics, config):
+    with open(path, 'w') as f:
+        json.dump({'config': config, 'metrics': metrics}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare_to_baseline(path, metrics, config, tolerance, min_delta=0.0):
+    """Print current vs baseline for every shared metric; return the names that regressed.
+
+    A metric regresses when it is worse by more than `tolerance` (relative)
+    and by more than `min_delta` (absolute), so sub-millisecond jitter in a
+    cheap stage isn't reported.
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    changed = {key: (baseline['config'].get(key), value) for key, value in config.items()
+               if baseline['config'].get(key) != value}
+    for key, (old, new) in sorted(changed.items()):
+        print(f"note: {key} was {old!r} in the baseline, now {new!r}")
+    regressions = []
+    print(f"\n{'metric':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(set(metrics) & set(baseline['metrics'])):
+        old, new = baseline['metrics'][name], metrics[name]
+        change = (new - old) / old if old else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = '  REGRESSION' if worse > tolerance and abs(new - old) > min_delta else ''
+        if flag:
+            regressions.append(name)
+        print(f"{name:<28} {old:>10.2f} {new:>10.2f} {change:>+8.1%}{flag}")
+    return regressions
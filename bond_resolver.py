@@ -0,0 +1,146 @@
+import functools
+import sys
+from collections import defaultdict, namedtuple
+
+BondMatch = namedtuple('BondMatch', 'bond alias confidence')
+
+# Soundex-style consonant classes; vowels and H/W/Y carry no sound class
+SOUND_CLASSES = {}
+for letters, code in (('BFPV', '1'), ('CGJKQSXZ', '2'), ('DT', '3'), ('L', '4'), ('MN', '5'), ('R', '6')):
+    for letter in letters:
+        SOUND_CLASSES[letter] = code
+
+
+def phonetic_key(token):
+    # Soundex without the fixed length: first letter, then collapsed classes
+    if not token or not token[0].isalpha():
+        return token
+    key = [token[0]]
+    last = SOUND_CLASSES.get(token[0])
+    for letter in token[1:]:
+        code = SOUND_CLASSES.get(letter)
+        if code and code != last:
+            key.append(code)
+        if letter not in 'HW':
+            last = code
+    return ''.join(key)
+
+
+def edit_distance(a, b, limit=None):
+    # Optimal string alignment distance (Levenshtein plus adjacent
+    # transpositions). With `limit`, gives up early and returns limit + 1 once
+    # the distance is known to exceed it.
+    if a == b:
+        return 0
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        left = i
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                value = prev[j - 1]
+            else:
+                value = prev[j - 1] + 1
+                if prev[j] < value - 1:
+                    value = prev[j] + 1
+                if left < value - 1:
+                    value = left + 1
+                if prev2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb and prev2[j - 2] < value - 1:
+                    value = prev2[j - 2] + 1
+            cur.append(value)
+            left = value
+        if limit is not None and min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    if limit is not None and prev[-1] > limit:
+        return limit + 1
+    return prev[-1]
+
+
+def deletes(token, depth):
+    # Every string reachable from token by removing up to `depth` characters
+    found = {token}
+    frontier = {token}
+    for _ in range(depth):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        found |= frontier
+    return found
+
+
+class BondResolver:
+    """Resolve transcribed tokens to bond codes.
+
+    Exact aliases are a dict lookup. Anything else may fuzzy-match an alias,
+    but only when both are at least `min_fuzzy_length` letters, at most
+    `max_distance` edits apart (found through a deletion-neighbourhood index)
+    and sound alike (same phonetic key). Shorter tokens, `ignore` words and
+    any token with fuzzy=False are exact-match only. Results are cached.
+    """
+
+    def __init__(self, aliases, valid_bonds, ignore=(), min_confidence=0.8,
+                 max_distance=1, min_fuzzy_length=5, cache_size=4096):
+        self.aliases = {alias: bond for alias, bond in aliases.items() if bond in valid_bonds}
+        for bond in valid_bonds:
+            self.aliases.setdefault(bond, bond)
+        self.ignore = frozenset(ignore)
+        self.min_confidence = min_confidence
+        self.max_distance = max_distance
+        self.min_fuzzy_length = min_fuzzy_length
+
+        self._by_deletion = defaultdict(set)
+        self._keys = {}
+        for alias in self.aliases:
+            # Short or numeric aliases ('BUND', 'AM', '80') are exact-match
+            # only: one edit away from them is mostly ordinary English
+            if len(alias) < min_fuzzy_length or not alias.isalpha():
+                continue
+            for variant in deletes(alias, max_distance):
+                self._by_deletion[variant].add(alias)
+            self._keys[alias] = phonetic_key(alias)
+
+        self.resolve = functools.lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _resolve(self, token, fuzzy=True):
+        bond = self.aliases.get(token)
+        if bond is not None:
+            return BondMatch(bond, token, 1.0)
+        if (not fuzzy or token in self.ignore or len(token) < self.min_fuzzy_length
+                or not token.isalpha()):
+            return None
+
+        key = phonetic_key(token)
+        candidates = set()
+        for variant in deletes(token, self.max_distance):
+            candidates |= self._by_deletion.get(variant, set())
+
+        best = None
+        best_bonds = set()
+        for alias in candidates:
+            if self._keys[alias] != key:
+                continue
+            distance = edit_distance(token, alias, self.max_distance)
+            if distance > self.max_distance:
+                continue
+            # Only an exact alias gets full confidence
+            confidence = round(min(1.0 - distance / max(len(token), len(alias)), 0.99), 3)
+            if best is None or confidence > best.confidence:
+                best = BondMatch(self.aliases[alias], alias, confidence)
+                best_bonds = {best.bond}
+            elif confidence == best.confidence:
+                best_bonds.add(self.aliases[alias])
+
+        if best is None or best.confidence < self.min_confidence:
+            return None
+        if len(best_bonds) > 1:
+            # Equally close to two different bonds: don't guess
+            return None
+        return best
+
+
+if __name__ == '__main__':
+    from quote_parser import BOND_RESOLVER
+    for token in sys.argv[1:]:
+        print(token, BOND_RESOLVER.resolve(token.upper()))
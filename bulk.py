@@ -0,0 +1,92 @@
+import io
+import os
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from inference import QueueFull
+
+# Limits for /transcribe/bulk: clips per request (loose files plus archive
+# members) and the size of the whole request
+BULK_MAX_CLIPS = int(os.environ.get('VOICEQUOTE_BULK_MAX_CLIPS', 64))
+BULK_MAX_UPLOAD_MB = float(os.environ.get('VOICEQUOTE_BULK_MAX_UPLOAD_MB', 100))
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.webm', '.ogg', '.m4a', '.mp4', '.flac')
+
+
+class BulkError(Exception):
+    pass
+
+
+def _is_audio(name):
+    base = os.path.basename(name)
+    return (not base.startswith('.') and not name.startswith('__MACOSX/')
+            and base.lower().endswith(AUDIO_EXTENSIONS))
+
+
+def read_archive(data, max_clips=BULK_MAX_CLIPS, max_clip_bytes=None):
+    """(name, bytes) for each audio file in a zip or tar (optionally compressed) archive."""
+    clips = []
+
+    def add(name, size, read):
+        if len(clips) >= max_clips:
+            raise BulkError(f'More than {max_clips} clips in one request')
+        # Checked against the header before extracting anything
+        if max_clip_bytes is not None and size > max_clip_bytes:
+            raise BulkError(f'{name} is larger than {max_clip_bytes // (1024 * 1024)} MB')
+        clips.append((name, read()))
+
+    try:
+        if zipfile.is_zipfile(io.BytesIO(data)):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and _is_audio(info.filename):
+                        add(info.filename, info.file_size, lambda: archive.read(info))
+        else:
+            with tarfile.open(fileobj=io.BytesIO(data), mode='r:*') as archive:
+                for member in archive:
+                    if member.isfile() and _is_audio(member.name):
+                        add(member.name, member.size, lambda: archive.extractfile(member).read())
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError):
+        raise BulkError('Unreadable archive, expected zip or tar') from None
+    return clips
+
+
+def transcribe_many(inference_queue, clips, window=None, profile=None):
+    """Yield (key, result) for each (key, audio) in clips as soon as it finishes.
+
+    At most `window` clips (default one full batch) are queued at a time so a
+    large request can't take every slot in the inference queue, and they go
+    in without a deadline, waiting for room when the queue is full. audio=None
+    is passed straight through as a None result; a failed transcription
+    yields its exception as the result.
+    """
+    window = window or inference_queue.max_batch_size
+    clips = iter(clips)
+    in_flight = {}
+    pending = None
+    while True:
+        while len(in_flight) < window:
+            if pending is None:
+                pending = next(clips, None)
+                if pending is None:
+                    break
+            key, audio = pending
+            if audio is None:
+                pending = None
+                yield key, None
+                continue
+            try:
+                in_flight[inference_queue.submit(audio, deadline=0, profile=profile)] = key
+            except QueueFull as e:
+                if in_flight:
+                    break
+                time.sleep(min(e.retry_after, 1))
+                continue
+            pending = None
+        if not in_flight:
+            return
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield in_flight.pop(future), future.exception() or future.result()
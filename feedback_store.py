@@ -0,0 +1,267 @@
+"""Storage for labelled samples from /save_training_data and /save_correction.
+
+Rows go to SQLite in WAL mode (safe across gunicorn workers and threads) via
+a background writer that commits in batches; audio files are written by the
+same thread into hash-sharded directories.
+
+    python feedback_store.py export training > training_data.csv
+    python feedback_store.py export corrections --pattern switch --since 2025-05-01
+    python feedback_store.py import training training_data.csv --audio-dir training_audio
+"""
+import argparse
+import atexit
+import csv
+import hashlib
+import logging
+import os
+import queue
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_DB = os.environ.get('VOICEQUOTE_FEEDBACK_DB', 'feedback.db')
+FEEDBACK_AUDIO_ROOT = os.environ.get('VOICEQUOTE_FEEDBACK_AUDIO_ROOT', '.')
+# A batch is committed when it has this many rows or the first row in it has
+# waited this long
+WRITE_BATCH_SIZE = int(os.environ.get('VOICEQUOTE_FEEDBACK_BATCH_SIZE', 64))
+WRITE_BATCH_WAIT_MS = float(os.environ.get('VOICEQUOTE_FEEDBACK_BATCH_WAIT_MS', 200))
+
+# Column order matches the CSV files these tables replace
+KINDS = {
+    'training': ('audio_filename', 'transcription', 'quote', 'pattern'),
+    'corrections': ('audio_filename', 'transcription', 'wrong_quote', 'correct_quote', 'pattern'),
+}
+AUDIO_DIRS = {'training': 'training_audio', 'corrections': 'correction_audio'}
+
+
+def stored_filename(filename):
+    # The name audio is saved under, or None if nothing usable is left once
+    # any directory part is stripped
+    name = os.path.basename(filename or '')
+    if name in ('', '.', '..') or '\0' in name:
+        return None
+    return name
+
+
+def shard(filename):
+    # Two hex characters -> 256 subdirectories per kind
+    return hashlib.sha1(filename.encode('utf-8')).hexdigest()[:2]
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class FeedbackStore:
+    def __init__(self, path=FEEDBACK_DB, audio_root=FEEDBACK_AUDIO_ROOT,
+                 batch_size=WRITE_BATCH_SIZE, batch_wait_ms=WRITE_BATCH_WAIT_MS):
+        self.path = path
+        self.audio_root = audio_root
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000.0
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._made_dirs = set()
+        with connect(path) as conn:
+            self._create_schema(conn)
+        conn.close()
+
+    def _create_schema(self, conn):
+        for kind, columns in KINDS.items():
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {kind} ("
+                "id INTEGER PRIMARY KEY, created_at TEXT NOT NULL, "
+                + ', '.join(f'{column} TEXT NOT NULL' for column in columns)
+                + ")"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {kind}_pattern ON {kind} (pattern, created_at)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {kind}_created ON {kind} (created_at)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {kind}_audio ON {kind} (audio_filename)")
+
+    def audio_path(self, kind, filename):
+        return os.path.join(self.audio_root, AUDIO_DIRS[kind], shard(filename), filename)
+
+    def add(self, kind, row, audio=None):
+        """Queue a row (dict with KINDS[kind] keys) and optional audio bytes."""
+        if kind not in KINDS:
+            raise ValueError(f'Unknown feedback kind {kind!r}')
+        filename = stored_filename(row['audio_filename'])
+        if filename is None:
+            raise ValueError(f"Invalid audio filename {row['audio_filename']!r}")
+        row = dict(row, audio_filename=filename)
+        self._ensure_started()
+        self._pending.put((kind, row, audio, datetime.now().isoformat(timespec='seconds')))
+
+    def flush(self, timeout=None):
+        # Block until everything queued before this call has been committed
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._pending.put(done)
+        return done.wait(timeout)
+
+    def _ensure_started(self):
+        # Lazy, like the inference worker, so it lives in the serving process
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='feedback-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush, 5)
+
+    def _next_batch(self):
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size and not isinstance(batch[0], threading.Event):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+            if isinstance(batch[-1], threading.Event):
+                break
+        return batch
+
+    def _run(self):
+        conn = connect(self.path)
+        while True:
+            batch = self._next_batch()
+            rows = [item for item in batch if not isinstance(item, threading.Event)]
+            try:
+                self._write(conn, rows)
+            except Exception:
+                logger.exception('Failed to write a batch of %d feedback rows', len(rows))
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write(self, conn, rows):
+        written = []
+        for item in rows:
+            kind, row, audio, _ = item
+            if audio is not None:
+                # One unwritable file only costs its own row, not the batch
+                try:
+                    self._write_audio(kind, row['audio_filename'], audio)
+                except (OSError, ValueError):
+                    logger.exception('Skipping %s row: could not save %r', kind, row['audio_filename'])
+                    continue
+            written.append(item)
+        rows = written
+        with conn:
+            for kind, columns in KINDS.items():
+                values = [(created_at,) + tuple(row[column] for column in columns)
+                          for row_kind, row, _, created_at in rows if row_kind == kind]
+                if values:
+                    conn.executemany(
+                        f"INSERT INTO {kind} (created_at, {', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' * (len(columns) + 1))})",
+                        values,
+                    )
+
+    def _write_audio(self, kind, filename, audio):
+        path = self.audio_path(kind, filename)
+        directory = os.path.dirname(path)
+        if directory not in self._made_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._made_dirs.add(directory)
+        with open(path, 'wb') as f:
+            f.write(audio)
+
+    def find(self, kind, pattern=None, since=None, until=None, limit=None):
+        """Rows of one kind, oldest first, filtered by pattern and created_at range."""
+        if kind not in KINDS:
+            raise ValueError(f'Unknown feedback kind {kind!r}')
+        query = f"SELECT * FROM {kind} WHERE 1=1"
+        params = []
+        if pattern is not None:
+            query += " AND pattern = ?"
+            params.append(pattern)
+        if since is not None:
+            query += " AND created_at >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND created_at < ?"
+            params.append(until)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        conn = connect(self.path)
+        try:
+            return [dict(row) for row in conn.execute(query, params)]
+        finally:
+            conn.close()
+
+    def export_csv(self, kind, out, **filters):
+        # Same columns and (headerless) layout as the old training_data.csv / corrections.csv
+        writer = csv.writer(out)
+        rows = self.find(kind, **filters)
+        for row in rows:
+            writer.writerow([row[column] for column in KINDS[kind]])
+        return len(rows)
+
+    def import_csv(self, kind, path, audio_dir=None):
+        # One-off migration of an old CSV (and its flat audio directory)
+        count = 0
+        with open(path, newline='', encoding='utf-8') as f:
+            for values in csv.reader(f):
+                if len(values) != len(KINDS[kind]):
+                    continue
+                row = dict(zip(KINDS[kind], values))
+                filename = stored_filename(row['audio_filename'])
+                if filename is None:
+                    continue
+                audio = None
+                if audio_dir:
+                    source = os.path.join(audio_dir, filename)
+                    if os.path.exists(source):
+                        target = self.audio_path(kind, filename)
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        shutil.copyfile(source, target)
+                self.add(kind, row, audio)
+                count += 1
+        self.flush()
+        return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=FEEDBACK_DB)
+    parser.add_argument('--audio-root', default=FEEDBACK_AUDIO_ROOT)
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='write rows in the old CSV format to stdout')
+    export.add_argument('kind', choices=KINDS)
+    export.add_argument('--pattern')
+    export.add_argument('--since', help='ISO date/time, inclusive')
+    export.add_argument('--until', help='ISO date/time, exclusive')
+    importer = commands.add_parser('import', help='load an old CSV file into the store')
+    importer.add_argument('kind', choices=KINDS)
+    importer.add_argument('csv_path')
+    importer.add_argument('--audio-dir', help='flat directory holding the CSV\'s audio files')
+    args = parser.parse_args()
+
+    store = FeedbackStore(args.db, args.audio_root)
+    if args.command == 'export':
+        count = store.export_csv(args.kind, sys.stdout, pattern=args.pattern, since=args.since, until=args.until)
+        print(f"Exported {count} rows", file=sys.stderr)
+    else:
+        count = store.import_csv(args.kind, args.csv_path, args.audio_dir)
+        print(f"Imported {count} rows", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
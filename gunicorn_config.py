@@ -1,4 +1,36 @@
+import gc
+import os
+
+from inference import BATCH_MAX_SIZE, QUEUE_MAX_DEPTH
+from replicas import plan_core_sets
+
 bind = "0.0.0.0:10000"
-workers = 1
-threads = 2
-timeout = 120 
\ No newline at end of file
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Request threads per worker. Enough by default for a full inference queue, a
+# batch on every replica and a few cheap requests besides, so a burst is turned
+# away by admission control (503 + Retry-After) instead of waiting unseen in
+# gunicorn's own unbounded backlog.
+threads = int(os.environ.get('VOICEQUOTE_THREADS', 0)) or (
+    QUEUE_MAX_DEPTH + max(1, len(plan_core_sets())) * BATCH_MAX_SIZE + 4
+)
+timeout = 120
+
+# Import main (and so load the model weights) once in the master. Forked
+# workers then share those pages copy-on-write instead of each loading
+# their own copy. Set VOICEQUOTE_PRELOAD=0 to load per worker instead.
+preload_app = os.environ.get('VOICEQUOTE_PRELOAD', '1') == '1'
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the GC's reach so collections in
+    # the workers don't write to (and so un-share) the model's pages
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # The worker only starts accepting connections once this returns, so
+    # /ready flips to 200 after the warmup clip has gone through the model.
+    # The model is never run in the master, so torch's thread pools are
+    # only created after the fork.
+    import main
+    main.warm_up()
@@ -0,0 +1,219 @@
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from metrics import BATCH_SIZE, REPLICA_BATCHES, SHED
+from replicas import pin_current_thread, plan_core_sets
+
+# Micro-batching settings: a batch is closed as soon as it is full or the
+# oldest job in it has waited BATCH_MAX_WAIT_MS.
+BATCH_MAX_SIZE = int(os.environ.get('VOICEQUOTE_BATCH_MAX_SIZE', 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get('VOICEQUOTE_BATCH_MAX_WAIT_MS', 25))
+
+# Admission control: submit() fails fast once this many clips are waiting, and
+# a clip still waiting this many seconds after its request arrived (or, with
+# no request, after it was queued) is dropped rather than transcribed for a
+# client that has likely given up.
+QUEUE_MAX_DEPTH = int(os.environ.get('VOICEQUOTE_QUEUE_MAX_DEPTH', 16))
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('VOICEQUOTE_REQUEST_DEADLINE', 20))
+
+
+class Overloaded(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFull(Overloaded):
+    pass
+
+
+class DeadlineExceeded(Overloaded):
+    pass
+
+
+class InferenceJob:
+    def __init__(self, audio, deadline, profile=None, started_at=None):
+        self.audio = audio
+        self.profile = profile
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.deadline = (started_at or self.enqueued_at) + deadline if deadline else None
+
+
+class InferenceQueue:
+    """Worker thread(s) that own the backend and decode jobs in batches.
+
+    Request threads call submit() with a 16 kHz float32 array and wait on the
+    returned future; whatever has queued up is handed to the backend's
+    transcribe_batch() in one call. At most max_depth jobs wait at once;
+    beyond that submit() raises QueueFull, and jobs past their deadline are
+    failed with DeadlineExceeded instead of being decoded.
+
+    With more than one core set there is one backend replica and worker
+    thread per set, pinned to those cores with a matching torch thread
+    count. Replicas take batches from the shared queue whenever they are
+    idle, so work always goes to the least loaded one.
+    """
+
+    def __init__(self, backend, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                 max_depth=QUEUE_MAX_DEPTH, deadline=REQUEST_DEADLINE_SECONDS, core_sets=None):
+        self.backend = backend
+        self.core_sets = plan_core_sets() if core_sets is None else core_sets
+        self.replicas = [backend] + [backend.replicate() for _ in self.core_sets[1:]]
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_depth = max(1, max_depth)
+        self.deadline = deadline if deadline and deadline > 0 else None
+        self._jobs = queue.Queue(self.max_depth)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._warmup_audio = None
+        # Smoothed batch duration, used to suggest a Retry-After
+        self._batch_seconds = 1.0
+
+    def retry_after(self):
+        batches_ahead = self.depth() // (self.max_batch_size * len(self.replicas)) + 1
+        return max(1, math.ceil(self._batch_seconds * batches_ahead))
+
+    def admit(self):
+        # Cheap early check so a request can be turned away before its upload
+        # is read and decoded; submit() still enforces the limit
+        if self._jobs.full():
+            SHED.inc(reason='queue_full')
+            raise QueueFull('Transcription queue is full', self.retry_after())
+
+    def submit(self, audio, deadline=None, profile=None, started_at=None):
+        # deadline: seconds this job may wait, None for the queue default, 0 for none
+        # profile: backend decoding profile name, None for the backend's default
+        # started_at: time.monotonic() the request arrived; the deadline runs from
+        # here, so time spent reading and decoding the upload counts against it
+        return self._enqueue(audio, deadline, profile, started_at).future
+
+    def _enqueue(self, audio, deadline, profile=None, started_at=None):
+        self._ensure_started()
+        job = InferenceJob(audio, deadline if deadline is not None else self.deadline, profile, started_at)
+        if job.deadline is not None and job.enqueued_at > job.deadline:
+            SHED.inc(reason='deadline')
+            raise DeadlineExceeded('Timed out waiting for transcription', self.retry_after())
+        try:
+            self._jobs.put_nowait(job)
+        except queue.Full:
+            SHED.inc(reason='queue_full')
+            raise QueueFull('Transcription queue is full', self.retry_after()) from None
+        return job
+
+    def depth(self):
+        return self._jobs.qsize()
+
+    def transcribe(self, audio, timeout=None, deadline=None, profile=None, started_at=None):
+        job = self._enqueue(audio, deadline, profile, started_at)
+        if job.deadline is not None:
+            try:
+                return job.future.result(timeout=max(0, job.deadline - time.monotonic()))
+            except FutureTimeout:
+                # Only a job that hasn't reached the model yet can be dropped
+                if job.future.cancel():
+                    SHED.inc(reason='deadline')
+                    raise DeadlineExceeded('Timed out waiting for transcription', self.retry_after()) from None
+            if timeout is not None:
+                timeout = max(0, timeout - (time.monotonic() - job.enqueued_at))
+        return job.future.result(timeout=timeout)
+
+    def warm_up(self, audio):
+        # Push a clip through every replica, each on its own (pinned) thread
+        if self._threads:
+            for _ in self.replicas:
+                self.transcribe(audio, deadline=0)
+            return
+        self._warmup_audio = audio
+        self._ensure_started()
+        for index, thread in enumerate(self._threads):
+            thread.warmed.wait()
+            if thread.error is not None:
+                raise RuntimeError(f'Inference replica {index} failed to start: {thread.error}') from thread.error
+
+    def _ensure_started(self):
+        # Started lazily so the threads are created in the process that serves
+        # requests rather than in one that may fork later.
+        if len(self._threads) == len(self.replicas) and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            threads = self._threads + [None] * (len(self.replicas) - len(self._threads))
+            for i, replica in enumerate(self.replicas):
+                if threads[i] is None or not threads[i].is_alive():
+                    cores = self.core_sets[i] if self.core_sets else None
+                    threads[i] = threading.Thread(target=self._run, args=(i, replica, cores),
+                                                  name=f'inference-worker-{i}', daemon=True)
+                    threads[i].warmed = threading.Event()
+                    threads[i].error = None
+                    threads[i].start()
+            self._threads = threads
+
+    def _next_batch(self):
+        first = self._jobs.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, index, backend, cores):
+        thread = threading.current_thread()
+        # Whatever happens, warm_up() must stop waiting, and hears about a
+        # replica that couldn't be pinned or warmed rather than hanging
+        try:
+            if cores:
+                pin_current_thread(cores)
+                backend.set_num_threads(len(cores))
+            if self._warmup_audio is not None:
+                backend.transcribe_batch([self._warmup_audio])
+        except Exception as e:
+            thread.error = e
+            return
+        finally:
+            thread.warmed.set()
+        while True:
+            jobs = self._next_batch()
+            started = time.monotonic()
+            batch = []
+            for job in jobs:
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                if job.deadline is not None and started > job.deadline:
+                    SHED.inc(reason='deadline')
+                    job.future.set_exception(DeadlineExceeded('Timed out waiting for transcription',
+                                                              self.retry_after()))
+                    continue
+                batch.append(job)
+            # One model call per decoding profile in the batch
+            groups = {}
+            for job in batch:
+                groups.setdefault(job.profile, []).append(job)
+            for profile, group in groups.items():
+                self._run_group(index, backend, profile, group)
+
+    def _run_group(self, index, backend, profile, batch):
+        started = time.monotonic()
+        BATCH_SIZE.observe(len(batch))
+        REPLICA_BATCHES.inc(replica=index)
+        try:
+            results = backend.transcribe_batch([job.audio for job in batch], profile)
+        except Exception as e:
+            for job in batch:
+                job.future.set_exception(e)
+            return
+        finished = time.monotonic()
+        self._batch_seconds = 0.8 * self._batch_seconds + 0.2 * (finished - started)
+        for job, result in zip(batch, results):
+            result.setdefault('timings', {})['queue'] = started - job.enqueued_at
+            job.future.set_result(result)
@@ -0,0 +1,275 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import closing
+
+import numpy as np
+
+from audio import SAMPLE_RATE, DecoderUnavailable, decode_audio
+from feedback_store import connect
+from inference import QueueFull
+from quote_parser import parse_quote
+from vad import trim_silence
+
+logger = logging.getLogger(__name__)
+
+# Background transcription jobs for recordings too long (or too many) to hold
+# an HTTP request open for. A job runs in the worker that accepted it; its
+# status and result are shared with the other workers through JOB_DB.
+JOB_WORKERS = int(os.environ.get('VOICEQUOTE_JOB_WORKERS', 2))
+MAX_JOBS = int(os.environ.get('VOICEQUOTE_MAX_JOBS', 256))
+JOB_RESULT_TTL = float(os.environ.get('VOICEQUOTE_JOB_RESULT_TTL', 3600))
+JOB_MAX_UPLOAD_MB = float(os.environ.get('VOICEQUOTE_JOB_MAX_UPLOAD_MB', 100))
+# Uploads are held in memory until a job worker takes them
+JOB_MAX_PENDING_BYTES = int(float(os.environ.get('VOICEQUOTE_JOB_MAX_PENDING_MB', 512)) * 1024 * 1024)
+JOB_DB = os.environ.get('VOICEQUOTE_JOB_DB', 'jobs.db')
+# How often a long-poll checks JOB_DB for a job another worker is running
+JOB_POLL_SECONDS = 0.25
+JOB_MAX_CLIP_SECONDS = float(os.environ.get('VOICEQUOTE_JOB_MAX_CLIP_SECONDS', 3600))
+# Longest a GET /jobs/<id>?wait= long-poll holds a gunicorn thread
+JOB_MAX_WAIT = float(os.environ.get('VOICEQUOTE_JOB_MAX_WAIT', 20))
+
+# Long recordings are cut into pieces of at most one Whisper window, at the
+# quietest point of the last SPLIT_SEARCH_SECONDS so words aren't cut in half.
+# Each piece is queued on its own, so interactive requests can still batch in
+# between instead of waiting behind a whole desk call.
+SEGMENT_SECONDS = 30
+SPLIT_SEARCH_SECONDS = 5
+SPLIT_FRAME_SECONDS = 0.1
+
+
+def split_long(audio, segment_seconds=SEGMENT_SECONDS):
+    segment = int(segment_seconds * SAMPLE_RATE)
+    search = int(SPLIT_SEARCH_SECONDS * SAMPLE_RATE)
+    frame = int(SPLIT_FRAME_SECONDS * SAMPLE_RATE)
+    pieces = []
+    start = 0
+    while len(audio) - start > segment:
+        window = audio[start + segment - search:start + segment]
+        energy = np.square(window[:len(window) // frame * frame].reshape(-1, frame)).sum(axis=1)
+        end = start + segment - search + int(np.argmin(energy)) * frame + frame // 2
+        pieces.append((start, end))
+        start = end
+    pieces.append((start, len(audio)))
+    return pieces
+
+
+class Job:
+    def __init__(self, data, profile=None):
+        self.id = uuid.uuid4().hex
+        self.data = data
+        self.size = len(data)
+        self.profile = profile
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.finished_at = None
+        self.expires_at = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def snapshot(self):
+        return job_snapshot(self.id, self.status, self.result, self.error)
+
+
+def job_snapshot(job_id, status, result, error):
+    snapshot = {'job_id': job_id, 'status': status}
+    if result is not None:
+        snapshot.update(result)
+    if error is not None:
+        snapshot['error'] = error
+    return snapshot
+
+
+class JobQueue:
+    """Background transcription jobs: the workers that run them plus a shared
+    SQLite table of their status and results.
+
+    Uploads wait in memory until a worker takes them, so submit() raises
+    QueueFull once this process holds max_jobs unfinished jobs or
+    max_pending_bytes of waiting audio. Status and results go to `path` (WAL
+    mode, shared by every gunicorn worker), so GET /jobs/<id> works whichever
+    worker it lands on. Results are kept for result_ttl seconds.
+    """
+
+    def __init__(self, inference_queue, workers=JOB_WORKERS, max_jobs=MAX_JOBS, result_ttl=JOB_RESULT_TTL,
+                 max_pending_bytes=JOB_MAX_PENDING_BYTES, path=JOB_DB):
+        self.inference_queue = inference_queue
+        self.workers = max(1, workers)
+        self.max_jobs = max(1, max_jobs)
+        self.result_ttl = result_ttl
+        self.max_pending_bytes = max_pending_bytes
+        self.path = path
+        self.pending_bytes = 0
+        # Unfinished jobs accepted by this process
+        self._jobs = {}
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._threads = []
+        with closing(connect(path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires_at)")
+
+    def submit(self, data, profile=None):
+        job = Job(data, profile)
+        with self._lock:
+            if len(self._jobs) >= self.max_jobs:
+                raise QueueFull('Too many jobs in progress', self.inference_queue.retry_after())
+            if self.pending_bytes + job.size > self.max_pending_bytes:
+                raise QueueFull('Too much audio waiting to be transcribed', self.inference_queue.retry_after())
+            self._jobs[job.id] = job
+            self.pending_bytes += job.size
+        try:
+            self._save(job)
+        except sqlite3.Error:
+            self._forget(job)
+            raise
+        with self._lock:
+            self._pending.append(job)
+            self._ready.notify()
+        self._ensure_started()
+        return job
+
+    def status(self, job_id, wait=0):
+        """Snapshot of a job accepted by any worker, or None if unknown or expired.
+
+        wait > 0 long-polls for up to that many seconds for it to finish.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            # Ours: wake as soon as it finishes
+            if wait and job.done.wait(wait):
+                return job.snapshot()
+            if not job.done.is_set():
+                return job.snapshot()
+            wait = 0
+        deadline = time.monotonic() + wait
+        while True:
+            snapshot = self._load(job_id)
+            remaining = deadline - time.monotonic()
+            if snapshot is None or snapshot['status'] in ('done', 'failed') or remaining <= 0:
+                return snapshot
+            time.sleep(min(JOB_POLL_SECONDS, remaining))
+
+    def depth(self):
+        return len(self._pending)
+
+    def _forget(self, job):
+        with self._lock:
+            if self._jobs.pop(job.id, None) is not None and job.data is not None:
+                self.pending_bytes -= job.size
+
+    def _save(self, job):
+        result = json.dumps(job.result) if job.result is not None else None
+        with closing(connect(self.path)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, status, result, error, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job.id, job.status, result, job.error, job.created_at, job.expires_at),
+            )
+            if job.expires_at is not None:
+                conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (time.time(),))
+
+    def _load(self, job_id):
+        with closing(connect(self.path)) as conn:
+            row = conn.execute(
+                "SELECT status, result, error FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (job_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row['result']) if row['result'] is not None else None
+        return job_snapshot(job_id, row['status'], result, row['error'])
+
+    def _ensure_started(self):
+        # Lazy for the same reason as the inference worker: threads don't survive a fork
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'job-worker-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._ready.wait()
+                job = self._pending.popleft()
+                job.status = 'running'
+            self._save_quietly(job)
+            try:
+                job.result = self._process(job)
+                job.status = 'done'
+            except DecoderUnavailable as e:
+                logger.error('Cannot decode job %s: %s', job.id, e)
+                job.error = 'Audio decoding is unavailable on this server'
+                job.status = 'failed'
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'failed'
+            with self._lock:
+                job.data = None
+                self.pending_bytes -= job.size
+            job.finished_at = time.time()
+            job.expires_at = job.finished_at + self.result_ttl
+            self._save_quietly(job)
+            job.done.set()
+            self._forget(job)
+
+    def _save_quietly(self, job):
+        # A worker thread must not die over a locked or unwritable database;
+        # the job still finishes for anyone long-polling this process
+        try:
+            self._save(job)
+        except sqlite3.Error:
+            logger.exception('Could not record job %s', job.id)
+
+    def _process(self, job):
+        audio = decode_audio(job.data)
+        if len(audio) > JOB_MAX_CLIP_SECONDS * SAMPLE_RATE:
+            raise ValueError(f'Recording longer than {JOB_MAX_CLIP_SECONDS:g} seconds')
+        segments = []
+        for start, end in split_long(audio):
+            # Trimmed per segment so start/end stay positions in the recording
+            speech = trim_silence(audio[start:end])
+            if not len(speech):
+                continue
+            text = self._transcribe(speech, job.profile)
+            quote, pattern_name = parse_quote(text, return_pattern=True)
+            segments.append({
+                'start': round(start / SAMPLE_RATE, 2),
+                'end': round(end / SAMPLE_RATE, 2),
+                'transcription': text,
+                'quote': quote,
+                'pattern': pattern_name,
+            })
+        transcription = ' '.join(segment['transcription'].strip() for segment in segments)
+        quote, pattern_name = parse_quote(transcription, return_pattern=True)
+        return {
+            'transcription': transcription,
+            'quote': quote,
+            'pattern': pattern_name,
+            'duration': round(len(audio) / SAMPLE_RATE, 2),
+            'segments': segments,
+        }
+
+    def _transcribe(self, audio, profile):
+        # Background work has no deadline and yields to interactive requests:
+        # when the inference queue is full, wait for room instead of failing
+        while True:
+            try:
+                return self.inference_queue.transcribe(audio, deadline=0, profile=profile)['text']
+            except QueueFull as e:
+                time.sleep(min(e.retry_after, 1))
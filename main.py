@@ -1,474 +1,493 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, g, Response, stream_with_context
+from flask.wrappers import Request
+import json
 import os
-import tempfile
-import whisper
-import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import csv
+import threading
+import time
 import uuid
-import difflib
 
-app = Flask(__name__)
+from audio import SAMPLE_RATE, AudioDecodeError, DecoderUnavailable, decode_audio, finalize_wav, warmup_clip
+from backends import DECODING_PROFILES, load_backend
+from bulk import BULK_MAX_CLIPS, BULK_MAX_UPLOAD_MB, BulkError, read_archive, transcribe_many
+from feedback_store import FeedbackStore, stored_filename
+from inference import InferenceQueue, Overloaded
+from jobs import JOB_MAX_UPLOAD_MB, JOB_MAX_WAIT, JobQueue
+import metrics
+from metrics import StageTimer
+from quote_parser import parse_quote
+from spool import AudioSpool
+from streaming import StreamError, StreamRegistry
+from vad import trim_silence
+
+# Larger uploads are rejected with 413 before they are read; longer clips
+# after decoding. Streams are held to the same limits in total.
+MAX_UPLOAD_MB = float(os.environ.get('VOICEQUOTE_MAX_UPLOAD_MB', 10))
+MAX_CLIP_SECONDS = float(os.environ.get('VOICEQUOTE_MAX_CLIP_SECONDS', 30))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+BULK_MAX_UPLOAD_BYTES = int(BULK_MAX_UPLOAD_MB * 1024 * 1024)
+JOB_MAX_UPLOAD_BYTES = int(JOB_MAX_UPLOAD_MB * 1024 * 1024)
 
-# Initialize Whisper model
-model = whisper.load_model("small")
-
-# Bond type mappings with common transcription errors
-BOND_MAPPINGS = {
-    # France
-    'FRANCE': 'OAT', 'OAT': 'OAT', 'OATS': 'OAT',
-    # Italy
-    'ITALY': 'BTP', 'BTP': 'BTP', 'BTPS': 'BTP', 'BEEPS': 'BTP', 'BDP': 'BTP',
-    # Germany
-    'GERMANY': 'DBR', 'BUND': 'DBR', 'DBR': 'DBR', 'WOOD': 'DBR', 'BOND': 'DBR',
-    'BOON': 'DBR', 'BOOND': 'DBR', 'BUN': 'DBR', 'BUNT': 'DBR', 'BUNN': 'DBR',
-    'BUNDT': 'DBR', 'BUNDE': 'DBR', 'BUNDA': 'DBR', 'BUNDER': 'DBR', 'BOUND': 'DBR',
-    'BUIND': 'DBR', 'BUIN': 'DBR', 'BUINN': 'DBR', 'BUINT': 'DBR',
-    # Netherlands
-    'HOLLAND': 'NETH', 'NETHER': 'NETH', 'GUILDER': 'NETH', 'NETHERLANDS': 'NETH',
-    # Austria
-    'AUSTRIA': 'RAGB', 'RAGB': 'RAGB', 'RAG': 'RAGB',
-    # Belgium
-    'BELGIUM': 'BGB', 'BGB': 'BGB', 'BEEGEEBEE': 'BGB', 'BELG': 'BGB', 'BELGIAN': 'BGB',
-    # Portugal
-    'PORTUGAL': 'PGB', 'PGB': 'PGB', 'PEEGEEBEE': 'PGB',
-    # Spain
-    'SPAIN': 'SPGB', 'SPGB': 'SPGB', 'SPEEGEEBEE': 'SPGB',
-    # Finland
-    'FINLAND': 'RFGB', 'FINNY': 'RFGB', 'RFGB': 'RFGB',
-    'OATM': 'OAT',
-    '80': 'OAT', 'AM': 'OAT',
+# Endpoints allowed a bigger request body than one clip's worth
+UPLOAD_LIMITS = {
+    'transcribe_bulk': BULK_MAX_UPLOAD_BYTES,
+    'submit_job': JOB_MAX_UPLOAD_BYTES,
 }
 
-# Add this near the top, after BOND_MAPPINGS
-VALID_BONDS = {'OAT', 'BTP', 'DBR', 'PGB', 'SPGB', 'NETH', 'RAGB', 'RFGB', 'BGB'}
+class LimitedRequest(Request):
+    # Flask reads the body limit from here; the endpoint is already matched
+    # by the time the body is parsed
+    @property
+    def max_content_length(self):
+        return UPLOAD_LIMITS.get(self.endpoint, super().max_content_length)
+
+app = Flask(__name__)
+app.request_class = LimitedRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Initialize the transcription backend (VOICEQUOTE_BACKEND picks fp32 or int8 Whisper)
+backend = load_backend()
+
+# All inference goes through worker threads that batch concurrent requests
+# (one per model replica, see VOICEQUOTE_REPLICAS)
+inference_queue = InferenceQueue(backend)
+
+# Background jobs for long recordings, fed through the same inference queue
+job_queue = JobQueue(inference_queue)
+
+# Open chunked-upload sessions for live transcription
+stream_registry = StreamRegistry()
+
+# Decodes each stream's latest window for a partial transcription, so chunk
+# uploads return at once (threads start on first use, after any fork)
+partial_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='stream-partial')
+# Partials are speculative, so one is only queued while the inference queue is
+# under half full; they can never crowd out /transcribe or a stream's finish
+PARTIAL_MAX_QUEUE_DEPTH = max(1, inference_queue.max_depth // 2)
+
+# Recent uploads, keyed by the audio_filename we hand back, so the save
+# endpoints don't need the audio uploaded a second time
+audio_spool = AudioSpool()
+
+# Labelled samples; rows and audio are written by a background batch writer
+feedback_store = FeedbackStore()
+
+# Gauges read at scrape time
+metrics.QUEUE_DEPTH.set_function(inference_queue.depth)
+metrics.JOB_DEPTH.set_function(job_queue.depth)
+metrics.MODEL_MEMORY.set(backend.memory_bytes())
+
+# Set once this process has pushed a warmup clip through the model
+ready = threading.Event()
+
+def warm_up():
+    # Runs in each serving process (gunicorn's post_worker_init, or before
+    # app.run) so the first real quote doesn't pay for lazy initialisation
+    inference_queue.warm_up(warmup_clip())
+    parse_quote("OAT 5/55 BID 10")
+    ready.set()
+
+@app.before_request
+def start_request():
+    # Monotonic, so it doubles as the start of the inference deadline
+    g.request_start = time.monotonic()
+    metrics.IN_FLIGHT.inc()
+
+@app.teardown_request
+def finish_request(exc):
+    metrics.IN_FLIGHT.dec()
+    if 'request_start' in g:
+        metrics.REQUEST_SECONDS.observe(time.monotonic() - g.request_start, endpoint=request.endpoint or 'unknown')
+
+@app.errorhandler(413)
+def upload_too_large(e, limit_mb=None):
+    metrics.SHED.inc(reason='too_large')
+    limit_mb = limit_mb or request.max_content_length / (1024 * 1024)
+    return jsonify({'error': f'Upload larger than {limit_mb:g} MB'}), 413
+
+def requested_profile():
+    # 'profile' query or form field; None keeps VOICEQUOTE_DECODING_PROFILE
+    return request.values.get('profile') or None
+
+def unknown_profile(profile):
+    if profile is None or profile in DECODING_PROFILES:
+        return None
+    return jsonify({'error': f"Unknown decoding profile {profile!r}, expected one of: {', '.join(DECODING_PROFILES)}"}), 400
+
+def overloaded(e):
+    response = jsonify({'error': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def decoder_unavailable(e):
+    # Server misconfiguration, so a 500 and a log line rather than a 400
+    app.logger.error('Cannot decode uploaded audio: %s', e)
+    return jsonify({'error': 'Audio decoding is unavailable on this server'}), 500
+
+def clip_too_long(audio):
+    if len(audio) <= MAX_CLIP_SECONDS * SAMPLE_RATE:
+        return None
+    metrics.SHED.inc(reason='too_long')
+    return jsonify({'error': f'Clip longer than {MAX_CLIP_SECONDS:g} seconds'}), 413
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
     return render_template('front_end.html')
 
+@app.route('/ready')
+def readiness():
+    if not ready.is_set():
+        return jsonify({'status': 'warming up'}), 503
+    return jsonify({'status': 'ready', 'backend': backend.name})
+
+def new_audio_filename():
+    return f"audio_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}.wav"
+
+def transcribe_audio(audio, data, timer, profile=None):
+    # Shared by /transcribe and the streaming endpoints; `data` is the raw
+    # upload, spooled for a later save_training_data/save_correction
+    speech = speech_for_model(audio, timer)
+    # No speech at all: skip the model rather than let it hallucinate on silence
+    if len(speech):
+        result = inference_queue.transcribe(speech, profile=profile, started_at=g.request_start)
+    else:
+        result = {'text': ''}
+    return transcription_result(audio, speech, data, result, timer)
+
+def speech_for_model(audio, timer):
+    with timer.stage('vad'):
+        speech = trim_silence(audio)
+    metrics.AUDIO_SECONDS.inc(len(audio) / SAMPLE_RATE, kind='received')
+    metrics.AUDIO_SECONDS.inc(len(speech) / SAMPLE_RATE, kind='transcribed')
+    return speech
+
+def transcription_result(audio, speech, data, result, timer, spool=True):
+    # Bulk clips pass spool=False: they'd evict the interactive uploads the
+    # spool is sized for, and nobody saves them from the bulk output
+    timer.update(result.get('timings', {}))
+    transcription = result['text']
+    print("Transcription:", transcription)
+    # Parse the quote and get pattern name
+    with timer.stage('parse'):
+        quote, pattern_name = parse_quote(transcription, return_pattern=True)
+    metrics.QUOTES.inc(pattern=pattern_name or 'none')
+    payload = {
+        'transcription': transcription,
+        'quote': quote,
+        'pattern': pattern_name,
+        'duration': round(len(audio) / SAMPLE_RATE, 2),
+        'trimmed_duration': round(len(speech) / SAMPLE_RATE, 2),
+        'timings': timer.as_ms()
+    }
+    if spool:
+        payload['audio_filename'] = new_audio_filename()
+        audio_spool.put(payload['audio_filename'], data)
+    return payload
+
+def timed_response(payload, timer):
+    with timer.stage('serialize'):
+        response = jsonify(payload)
+    timer.observe()
+    return response
+
 @app.route('/transcribe', methods=['POST'])
 def transcribe():
-    if 'file' not in request.files:
+    # Turn the request away before spending time on the upload if it would
+    # only be refused a queue slot afterwards
+    if (request.content_length or 0) > MAX_UPLOAD_BYTES:
+        return upload_too_large(None, MAX_UPLOAD_MB)
+    try:
+        inference_queue.admit()
+    except Overloaded as e:
+        return overloaded(e)
+    timer = StageTimer()
+    with timer.stage('upload'):
+        audio_file = request.files.get('file')
+        data = audio_file.read() if audio_file else None
+    if audio_file is None:
         return jsonify({'error': 'No audio file provided'}), 400
-    audio_file = request.files['file']
-    temp_audio_path = None
-    unique_audio_filename = f"audio_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}.wav"
+    profile = requested_profile()
+    if unknown_profile(profile):
+        return unknown_profile(profile)
     try:
-        # Save the audio file temporarily with a unique name
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_audio:
-            temp_audio_path = temp_audio.name
-            audio_file.save(temp_audio_path)
-        # Transcribe the audio with English language specified
-        result = model.transcribe(temp_audio_path, language="en")
-        transcription = result['text']
-        print("Transcription:", transcription)
-        # Parse the quote and get pattern name
-        quote, pattern_name = parse_quote(transcription, return_pattern=True)
-        return jsonify({
-            'transcription': transcription,
-            'quote': quote,
-            'audio_filename': unique_audio_filename,
-            'pattern': pattern_name
-        })
+        # Decode the upload in memory, then wait for the inference worker to transcribe it
+        with timer.stage('decode'):
+            audio = decode_audio(data)
+    except AudioDecodeError as e:
+        return jsonify({'error': str(e)}), 400
+    except DecoderUnavailable as e:
+        return decoder_unavailable(e)
+    too_long = clip_too_long(audio)
+    if too_long:
+        return too_long
+    try:
+        return timed_response(transcribe_audio(audio, data, timer, profile), timer)
+    except Overloaded as e:
+        return overloaded(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if temp_audio_path and os.path.exists(temp_audio_path):
+
+@app.route('/transcribe/bulk', methods=['POST'])
+def transcribe_bulk():
+    # Any number of 'file' parts and/or zip/tar 'archive' parts. Clips are
+    # batched through the model together and one NDJSON line per clip is
+    # streamed back as each finishes (so not necessarily in upload order).
+    if (request.content_length or 0) > BULK_MAX_UPLOAD_BYTES:
+        return upload_too_large(None, BULK_MAX_UPLOAD_MB)
+    try:
+        clips = [(f.filename, f.read()) for f in request.files.getlist('file')]
+        for archive in request.files.getlist('archive'):
+            clips.extend(read_archive(archive.read(), BULK_MAX_CLIPS - len(clips), MAX_UPLOAD_BYTES))
+    except BulkError as e:
+        return jsonify({'error': str(e)}), 400
+    if not clips:
+        return jsonify({'error': 'No audio files provided'}), 400
+    if len(clips) > BULK_MAX_CLIPS:
+        return jsonify({'error': f'More than {BULK_MAX_CLIPS} clips in one request'}), 413
+    profile = requested_profile()
+    if unknown_profile(profile):
+        return unknown_profile(profile)
+    try:
+        inference_queue.admit()
+    except Overloaded as e:
+        return overloaded(e)
+
+    prepared = {}
+
+    def prepare():
+        # Decoded lazily, so the first clips are already in the model while
+        # later ones are still being decoded
+        for index, (filename, data) in enumerate(clips):
+            timer = StageTimer()
             try:
-                os.unlink(temp_audio_path)
-            except:
-                pass
-
-def parse_quote(text, return_pattern=False):
-    # Convert to uppercase for standardization
-    text = text.upper()
-    print("parse_quote called with:", text)
-    
-    # Pattern: Bond name and maturity first
-    print("Trying pattern_bond_first...")
-    pattern_bond_first = r'([A-Z]+)\s+([A-Z]+|\d{1,2})/(\d{2}),?\s*(?:I CAN\s+)?(BUY|SELL|BID|OFFER)?\s*(\d+)M?(?:\s*(?:AT|IN)?\s*(\d+))?'
-    match_bond_first = re.search(pattern_bond_first, text)
-    if match_bond_first:
-        print("pattern_bond_first matched!", match_bond_first.groups())
-        bond_type, month, year, action, size, price = match_bond_first.groups()
-        bond_token = bond_type
-        if bond_type not in BOND_MAPPINGS and month in BOND_MAPPINGS:
-            bond_token = month
-            month = bond_type
-        bond_type = BOND_MAPPINGS.get(bond_token, bond_token)
-        if bond_type not in VALID_BONDS:
-            return "No valid bond quote found", None
-        month_map = {
-            'JANUARY': '01', 'FEBRUARY': '02', 'MARCH': '03', 'APRIL': '04',
-            'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUGUST': '08',
-            'SEPTEMBER': '09', 'OCTOBER': '10', 'NOVEMBER': '11', 'DECEMBER': '12'
-        }
-        month_num = month_map.get(month, month.zfill(2))
-        size = f"{size}M" if size else ''
-        if action in ('BUY', 'BID'):
-            quote_type = 'BID'
-        elif action in ('SELL', 'OFFER'):
-            quote_type = 'OFFER'
-        else:
-            quote_type = ''
-        out = f"{bond_type} {month_num}/{year}"
-        if price:
-            out += f" {price}"
-        if quote_type:
-            out += f" {quote_type}"
-        if size:
-            out += f" IN {size}"
-        if return_pattern:
-            return out, "pattern_bond_first"
-        return out
-    else:
-        print("pattern_bond_first did not match")
-
-    # Pattern: Maturity first, then bond name
-    print("Trying pattern_maturity_first...")
-    pattern_maturity_first = r'([A-Z]+|\d{1,2})/(\d{2})\s+([A-Z]+)\s*(?:I CAN\s+)?(BUY|SELL|BID|OFFER)?\s*(\d+)M?(?:\s*(?:AT|IN)?\s*(\d+))?'
-    match_maturity_first = re.search(pattern_maturity_first, text)
-    if match_maturity_first:
-        print("pattern_maturity_first matched!", match_maturity_first.groups())
-        month, year, bond_type, action, size, price = match_maturity_first.groups()
-        bond_token = bond_type
-        if bond_type not in BOND_MAPPINGS and month in BOND_MAPPINGS:
-            bond_token = month
-            month = bond_type
-        bond_type = BOND_MAPPINGS.get(bond_token, bond_token)
-        if bond_type not in VALID_BONDS:
-            return "No valid bond quote found", None
-        month_map = {
-            'JANUARY': '01', 'FEBRUARY': '02', 'MARCH': '03', 'APRIL': '04',
-            'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUGUST': '08',
-            'SEPTEMBER': '09', 'OCTOBER': '10', 'NOVEMBER': '11', 'DECEMBER': '12'
-        }
-        month_num = month_map.get(month, month.zfill(2))
-        size = f"{size}M" if size else ''
-        if action in ('BUY', 'BID'):
-            quote_type = 'BID'
-        elif action in ('SELL', 'OFFER'):
-            quote_type = 'OFFER'
-        else:
-            quote_type = ''
-        out = f"{bond_type} {month_num}/{year}"
-        if price:
-            out += f" {price}"
-        if quote_type:
-            out += f" {quote_type}"
-        if size:
-            out += f" IN {size}"
-        if return_pattern:
-            return out, "pattern_maturity_first"
-        return out
-    else:
-        print("pattern_maturity_first did not match")
-    
-    # Most flexible switch pattern with debug prints and transcription error handling
-    print("Trying switch pattern...")
-    pattern_switch = (
-        r'I CAN (BUY|SELL)\s+(?:A\s+)?([A-Z]+)\s+(?:THE\s+)?([A-Z]+)\s+(\d{2})'
-        r'\s+AGAINST\s+(?:THE\s+)?([A-Z]+)\s+(?:THE\s+)?([A-Z]+)\s+(\d{2})'
-        r'(?:,?\s+(?:I\s+)?(PICK|PEAK|PIC|GIVE)\s+(\d+)(?:\s+IN\s+(\d+)\s*MILLION)?)?'
-    )
-    match_switch = re.search(pattern_switch, text)
-    if match_switch:
-        print("Switch pattern matched!", match_switch.groups())
-        action, bond1, month1, year1, bond2, month2, year2, price_type, price, size = match_switch.groups()
-        print(f"Matched groups: {match_switch.groups()}")
-        # Convert bond types to standard format
-        bond1 = BOND_MAPPINGS.get(bond1, bond1)
-        bond2 = BOND_MAPPINGS.get(bond2, bond2)
-        # Convert month names to numbers
-        month_map = {
-            'JANUARY': '01', 'FEBRUARY': '02', 'MARCH': '03', 'APRIL': '04',
-            'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUGUST': '08',
-            'SEPTEMBER': '09', 'OCTOBER': '10', 'NOVEMBER': '11', 'DECEMBER': '12'
-        }
-        month1_num = month_map.get(month1, month1)
-        month2_num = month_map.get(month2, month2)
-        # Normalize price_type to PICK if it's PEAK or PIC
-        if price_type in ('PEAK', 'PIC'):
-            price_type = 'PICK'
-        # If price_type, price, or size are missing, search the rest of the text
-        if not (price_type and price and size):
-            # Remove the matched part from text
-            end_idx = match_switch.end()
-            rest = text[end_idx:]
-            extra = re.search(r'(PICK|PEAK|PIC|GIVE)\s+(\d+)(?:\s+IN\s+(\d+)\s*MILLION)?', rest)
-            if extra:
-                pt, p, s = extra.groups()
-                if pt in ('PEAK', 'PIC'):
-                    pt = 'PICK'
-                price_type = price_type or pt
-                price = price or p
-                size = size or s
-        # Format the switch quote
-        base = f"I CAN {action} {bond1} {month1_num}/{year1} VS {bond2} {month2_num}/{year2}"
-        if price_type and price:
-            base += f" {price_type} {price}"
-        if size:
-            base += f" IN {size}M"
-        print("Formatted output:", base)
-        # Check if both bond types are valid
-        if bond1 not in VALID_BONDS or bond2 not in VALID_BONDS:
-            return "No valid bond quote found", None
-        if return_pattern:
-            return base, "switch"
-        return base
-    else:
-        print("Switch pattern did not match")
-    
-    # Pattern 6: Simple format without I'm (e.g., "OAT May 55 12 offer 72 million")
-    print("Trying pattern 6...")
-    pattern6 = r'([A-Z]+)\s+([A-Z]+)\s+(\d{2})\s+(\d+)\s+OFFER\s+(\d+)\s+MILLION'
-    match6 = re.search(pattern6, text)
-    if match6:
-        print("Pattern 6 matched!", match6.groups())
-        bond_type, month, year, price, size = match6.groups()
-        
-        # Convert size to standard format
-        size = f"{size}M"
-        
-        # Convert bond type to standard format
-        bond_type = BOND_MAPPINGS.get(bond_type, bond_type)
-        
-        # Convert month to number
-        month_map = {
-            'JANUARY': '01', 'FEBRUARY': '02', 'MARCH': '03', 'APRIL': '04',
-            'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUGUST': '08',
-            'SEPTEMBER': '09', 'OCTOBER': '10', 'NOVEMBER': '11', 'DECEMBER': '12'
-        }
-        month_num = month_map.get(month, month)
-        
-        # Check if bond type is valid
-        if bond_type not in VALID_BONDS:
-            return "No valid bond quote found", None
-        
-        # Format the quote exactly as required
-        if return_pattern:
-            return f"{bond_type} {month_num}/{year} {price} OFFER IN {size}", "pattern6"
-        return f"{bond_type} {month_num}/{year} {price} OFFER IN {size}"
-    else:
-        print("Pattern 6 did not match")
-    
-    # Pattern 5: New simple format (e.g., "OAT May 55, I'm 7 offer in 12 million")
-    print("Trying pattern 5...")
-    pattern5 = r'([A-Z]+)\s+([A-Z]+)\s+(\d{2}),?\s+(?:I\'M|I AM)\s+(\d+)\s+OFFER\s+IN\s+(\d+)\s+MILLION'
-    match5 = re.search(pattern5, text)
-    if match5:
-        print("Pattern 5 matched!", match5.groups())
-        bond_type, month, year, price, size = match5.groups()
-        
-        # Convert size to standard format
-        size = f"{size}M"
-        
-        # Convert bond type to standard format
-        bond_type = BOND_MAPPINGS.get(bond_type, bond_type)
-        
-        # Convert month to number
-        month_map = {
-            'JANUARY': '01', 'FEBRUARY': '02', 'MARCH': '03', 'APRIL': '04',
-            'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUGUST': '08',
-            'SEPTEMBER': '09', 'OCTOBER': '10', 'NOVEMBER': '11', 'DECEMBER': '12'
-        }
-        month_num = month_map.get(month, month)
-        
-        # Check if bond type is valid
-        if bond_type not in VALID_BONDS:
-            return "No valid bond quote found", None
-        
-        # Format the quote exactly as required
-        if return_pattern:
-            return f"{bond_type} {month_num}/{year} {price} OFFER IN {size}", "pattern5"
-        return f"{bond_type} {month_num}/{year} {price} OFFER IN {size}"
-    else:
-        print("Pattern 5 did not match")
-    
-    # Pattern 4: New format with bond first (e.g., "BTP September 17, 12 offer in 40 million")
-    print("Trying pattern 4...")
-    pattern4 = r'([A-Z]+)\s+([A-Z]+)\s+(\d{2}),?\s+(\d+)\s+OFFER\s+IN\s+(\d+)\s+MILLION'
-    match4 = re.search(pattern4, text)
-    if match4:
-        print("Pattern 4 matched!", match4.groups())
-        bond_type, month, year, price, size = match4.groups()
-        
-        # Convert size to standard format
-        size = f"{size}M"
-        
-        # Convert bond type to standard format
-        bond_type = BOND_MAPPINGS.get(bond_type, bond_type)
-        
-        # Convert month to number
-        month_map = {
-            'JANUARY': '01', 'FEBRUARY': '02', 'MARCH': '03', 'APRIL': '04',
-            'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUGUST': '08',
-            'SEPTEMBER': '09', 'OCTOBER': '10', 'NOVEMBER': '11', 'DECEMBER': '12'
-        }
-        month_num = month_map.get(month, month)
-        
-        # Check if bond type is valid
-        if bond_type not in VALID_BONDS:
-            return "No valid bond quote found", None
-        
-        # Remove any decimal point from price
-        price = price.split('.')[0]
-        
-        # Format the quote exactly as required
-        if return_pattern:
-            return f"{bond_type} {month_num}/{year} {price} OFFER IN {size}", "pattern4"
-        return f"{bond_type} {month_num}/{year} {price} OFFER IN {size}"
-    else:
-        print("Pattern 4 did not match")
-    
-    # Pattern 3: New format with price (e.g., "I can sell 30 million of bond September 72 at 79")
-    print("Trying pattern 3...")
-    pattern3 = r'I CAN (BUY|SELL)\s+(\d+)\s*(?:MILLION|M)\s*(?:OF)?\s*([A-Z]+)\s*([A-Z]+)\s*(\d{2})\s*(?:AT|IN)\s*(\d+\.?\d*)'
-    match3 = re.search(pattern3, text)
-    if match3:
-        print("Pattern 3 matched!", match3.groups())
-        action, size, bond_type, month, year, price = match3.groups()
-        
-        # Convert size to standard format
-        size = f"{size}M"
-        
-        # Convert bond type to standard format
-        bond_type = BOND_MAPPINGS.get(bond_type, bond_type)
-        
-        # Convert month to number
-        month_map = {
-            'JANUARY': '01', 'FEBRUARY': '02', 'MARCH': '03', 'APRIL': '04',
-            'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUGUST': '08',
-            'SEPTEMBER': '09', 'OCTOBER': '10', 'NOVEMBER': '11', 'DECEMBER': '12'
-        }
-        month_num = month_map.get(month, month)
-        
-        # Check if bond type is valid
-        if bond_type not in VALID_BONDS:
-            return "No valid bond quote found", None
-        
-        # Determine if it's an offer or bid
-        quote_type = "OFFER" if action == "SELL" else "BID"
-        
-        # Remove any decimal point from price
-        price = price.split('.')[0]
-        
-        # Format the quote exactly as required
-        if return_pattern:
-            return f"{bond_type} {month_num}/{year} {price} {quote_type} IN {size}", "pattern3"
-        return f"{bond_type} {month_num}/{year} {price} {quote_type} IN {size}"
-    else:
-        print("Pattern 3 did not match")
-    
-    # Pattern 2: Original format without price (e.g., "I can buy 72 million of bund October 71")
-    print("Trying pattern 2...")
-    pattern2 = r'I CAN (BUY|SELL)\s+(\d+)\s*(?:MILLION|M)\s*(?:OF)?\s*([A-Z]+)\s*([A-Z]+)\s*(\d{2})'
-    match2 = re.search(pattern2, text)
-    if match2:
-        print("Pattern 2 matched!", match2.groups())
-        action, size, bond_type, month, year = match2.groups()
-        
-        # Convert size to standard format
-        size = f"{size}M"
-        
-        # Convert bond type to standard format
-        bond_type = BOND_MAPPINGS.get(bond_type, bond_type)
-        
-        # Convert month to number
-        month_map = {
-            'JANUARY': '01', 'FEBRUARY': '02', 'MARCH': '03', 'APRIL': '04',
-            'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUGUST': '08',
-            'SEPTEMBER': '09', 'OCTOBER': '10', 'NOVEMBER': '11', 'DECEMBER': '12'
-        }
-        month_num = month_map.get(month, month)
-        
-        # Check if bond type is valid
-        if bond_type not in VALID_BONDS:
-            return "No valid bond quote found", None
-        
-        # Format the quote exactly as required
-        if return_pattern:
-            return f"CAN {action} {size} {bond_type} {month_num}/{year}", "pattern2"
-        return f"CAN {action} {size} {bond_type} {month_num}/{year}"
-    else:
-        print("Pattern 2 did not match")
-    
-    # Pattern 1: Bond and maturity first, then action and size
-    print("Trying pattern 1...")
-    pattern1 = r'([A-Z]+)\s+([A-Z]+)\s+(\d{2}),?\s+I CAN (BUY|SELL)\s+(\d+)\s*(?:MILLION|M)'
-    match1 = re.search(pattern1, text)
-    if match1:
-        print("Pattern 1 matched!", match1.groups())
-        bond_type, month, year, action, size = match1.groups()
-        
-        # Convert size to standard format
-        size = f"{size}M"
-        
-        # Convert bond type to standard format
-        bond_type = BOND_MAPPINGS.get(bond_type, bond_type)
-        
-        # Convert month to number
-        month_map = {
-            'JANUARY': '01', 'FEBRUARY': '02', 'MARCH': '03', 'APRIL': '04',
-            'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUGUST': '08',
-            'SEPTEMBER': '09', 'OCTOBER': '10', 'NOVEMBER': '11', 'DECEMBER': '12'
-        }
-        month_num = month_map.get(month, month)
-        
-        # Check if bond type is valid
-        if bond_type not in VALID_BONDS:
-            return "No valid bond quote found", None
-        
-        # Format the quote exactly as required
-        if return_pattern:
-            return f"CAN {action} {size} {bond_type} {month_num}/{year}", "pattern1"
-        return f"CAN {action} {size} {bond_type} {month_num}/{year}"
+                with timer.stage('decode'):
+                    audio = decode_audio(data)
+            except AudioDecodeError as e:
+                prepared[index] = str(e)
+                yield index, None
+                continue
+            except DecoderUnavailable as e:
+                app.logger.error('Cannot decode uploaded audio: %s', e)
+                prepared[index] = 'Audio decoding is unavailable on this server'
+                yield index, None
+                continue
+            if len(audio) > MAX_CLIP_SECONDS * SAMPLE_RATE:
+                metrics.SHED.inc(reason='too_long')
+                prepared[index] = f'Clip longer than {MAX_CLIP_SECONDS:g} seconds'
+                yield index, None
+                continue
+            speech = speech_for_model(audio, timer)
+            prepared[index] = (audio, speech, timer)
+            yield index, speech if len(speech) else None
+
+    def generate():
+        for index, result in transcribe_many(inference_queue, prepare(), profile=profile):
+            filename, data = clips[index]
+            entry = prepared.pop(index)
+            if isinstance(entry, str):
+                line = {'error': entry}
+            elif isinstance(result, Exception):
+                line = {'error': str(result)}
+            else:
+                audio, speech, timer = entry
+                line = transcription_result(audio, speech, data, result or {'text': ''}, timer, spool=False)
+                timer.observe()
+            yield json.dumps({'index': index, 'filename': filename, **line}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/stream', methods=['POST'])
+def open_stream():
+    # ?profile= applies to every partial and the final result of this stream
+    profile = requested_profile()
+    if unknown_profile(profile):
+        return unknown_profile(profile)
+    try:
+        session = stream_registry.open(profile)
+    except StreamError as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({'stream_id': session.id})
+
+def partial_headroom():
+    return inference_queue.depth() < PARTIAL_MAX_QUEUE_DEPTH
+
+def refresh_partial(session):
+    # At most one partial per stream is in flight. Chunks that arrive in the
+    # meantime only append; the first chunk after it finishes starts the next.
+    if partial_headroom() and session.transcribing.acquire(blocking=False):
+        partial_pool.submit(run_partial, session)
+
+def run_partial(session):
+    future = None
+    try:
+        speech = trim_silence(session.window(session.contents()))
+        # Checked again: the queue may have filled while the window was trimmed
+        if len(speech) and partial_headroom():
+            future = session.submit_partial(lambda: inference_queue.submit(speech, profile=session.profile))
+    except (AudioDecodeError, DecoderUnavailable, Overloaded):
+        # Not enough of the container has arrived to decode yet, or the
+        # server is busy; partials are best-effort so just skip this one
+        pass
+    except Exception:
+        app.logger.exception('Partial transcription failed')
+    if future is None:
+        session.transcribing.release()
     else:
-        print("Pattern 1 did not match")
-    
-    print("No pattern matched. Returning 'No valid bond quote found'.")
-    return "No valid bond quote found", None
+        future.add_done_callback(lambda f: partial_done(session, f))
+
+def partial_done(session, future):
+    try:
+        session.pending = None
+        if not future.cancelled() and future.exception() is None:
+            transcription = future.result()['text']
+            quote, pattern_name = parse_quote(transcription, return_pattern=True)
+            session.update(transcription, quote, pattern_name)
+    finally:
+        session.transcribing.release()
+
+def stream_too_large(session, incoming=0):
+    return session.size + incoming > MAX_UPLOAD_BYTES
+
+@app.route('/stream/<stream_id>/chunk', methods=['POST'])
+def stream_chunk(stream_id):
+    # Append-only: returns straight away with the latest partial, which is
+    # re-transcribed in the background
+    try:
+        session = stream_registry.get(stream_id)
+    except KeyError:
+        return jsonify({'error': 'Unknown stream'}), 404
+    # Checked against Content-Length before the chunk is read, and against
+    # the total after for uploads without one
+    if stream_too_large(session, request.content_length or 0):
+        stream_registry.close(stream_id)
+        return upload_too_large(None, MAX_UPLOAD_MB)
+    try:
+        session.append(request.args.get('seq', type=int), request.get_data())
+    except StreamError as e:
+        return jsonify({'error': str(e)}), 409
+    if stream_too_large(session):
+        stream_registry.close(stream_id)
+        return upload_too_large(None, MAX_UPLOAD_MB)
+    refresh_partial(session)
+    return jsonify(session.snapshot())
+
+@app.route('/stream/<stream_id>/finish', methods=['POST'])
+def stream_finish(stream_id):
+    # Closing the stream drops any partial still waiting for the model, so
+    # the final transcription goes straight to the front
+    session = stream_registry.close(stream_id)
+    if session is None:
+        return jsonify({'error': 'Unknown stream'}), 404
+    if stream_too_large(session, request.content_length or 0):
+        return upload_too_large(None, MAX_UPLOAD_MB)
+    timer = StageTimer()
+    try:
+        with timer.stage('upload'):
+            session.append(request.args.get('seq', type=int), request.get_data())
+            data = finalize_wav(session.contents())
+        with timer.stage('decode'):
+            audio = decode_audio(data)
+    except (StreamError, AudioDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except DecoderUnavailable as e:
+        return decoder_unavailable(e)
+    too_long = clip_too_long(audio)
+    if too_long:
+        return too_long
+    try:
+        return timed_response(transcribe_audio(audio, data, timer, session.profile), timer)
+    except Overloaded as e:
+        return overloaded(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    # Returns straight away; poll GET /jobs/<job_id> for the result
+    if (request.content_length or 0) > JOB_MAX_UPLOAD_BYTES:
+        return upload_too_large(None, JOB_MAX_UPLOAD_MB)
+    if 'file' not in request.files:
+        return jsonify({'error': 'No audio file provided'}), 400
+    profile = requested_profile()
+    if unknown_profile(profile):
+        return unknown_profile(profile)
+    try:
+        job = job_queue.submit(request.files['file'].read(), profile)
+    except Overloaded as e:
+        return overloaded(e)
+    response = jsonify(job.snapshot())
+    response.status_code = 202
+    response.headers['Location'] = f'/jobs/{job.id}'
+    return response
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    # ?wait=N long-polls for up to N seconds (capped at JOB_MAX_WAIT) for the job to finish
+    wait = min(max(request.args.get('wait', 0, type=float), 0), JOB_MAX_WAIT)
+    snapshot = job_queue.status(job_id, wait)
+    if snapshot is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(snapshot)
+
+def saved_audio(audio_filename):
+    # Use the spooled copy from /transcribe; an uploaded 'audio' file is only
+    # needed if it has been evicted or was handled by another worker
+    data = audio_spool.get(audio_filename)
+    if data is None and 'audio' in request.files:
+        data = request.files['audio'].read()
+    return data
 
 @app.route('/save_training_data', methods=['POST'])
 def save_training_data():
-    audio = request.files.get('audio')
     transcription = request.form.get('transcription')
     quote = request.form.get('quote')
     pattern = request.form.get('pattern')
     audio_filename = request.form.get('audio_filename')
-    if not (audio and transcription and quote and pattern and audio_filename):
+    if not (transcription and quote and pattern and audio_filename):
         return jsonify({'error': 'Missing data'}), 400
-    audio_dir = 'training_audio'
-    os.makedirs(audio_dir, exist_ok=True)
-    audio_path = os.path.join(audio_dir, audio_filename)
-    audio.save(audio_path)
-    csv_path = 'training_data.csv'
-    with open(csv_path, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([audio_filename, transcription, quote, pattern])
+    if stored_filename(audio_filename) is None:
+        return jsonify({'error': 'Invalid audio_filename'}), 400
+    audio = saved_audio(audio_filename)
+    if audio is None:
+        return jsonify({'error': 'Audio not found, upload it again'}), 404
+    feedback_store.add('training', {
+        'audio_filename': audio_filename,
+        'transcription': transcription,
+        'quote': quote,
+        'pattern': pattern
+    }, audio)
     return jsonify({'status': 'ok'})
 
 @app.route('/save_correction', methods=['POST'])
 def save_correction():
-    audio = request.files.get('audio')
     transcription = request.form.get('transcription')
     wrong_quote = request.form.get('wrong_quote')
     correct_quote = request.form.get('correct_quote')
     pattern = request.form.get('pattern')
     audio_filename = request.form.get('audio_filename')
-    if not (audio and transcription and wrong_quote and correct_quote and pattern and audio_filename):
+    if not (transcription and wrong_quote and correct_quote and pattern and audio_filename):
         return jsonify({'error': 'Missing data'}), 400
-    audio_dir = 'correction_audio'
-    os.makedirs(audio_dir, exist_ok=True)
-    audio_path = os.path.join(audio_dir, audio_filename)
-    audio.save(audio_path)
-    csv_path = 'corrections.csv'
-    with open(csv_path, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([audio_filename, transcription, wrong_quote, correct_quote, pattern])
+    if stored_filename(audio_filename) is None:
+        return jsonify({'error': 'Invalid audio_filename'}), 400
+    audio = saved_audio(audio_filename)
+    if audio is None:
+        return jsonify({'error': 'Audio not found, upload it again'}), 404
+    feedback_store.add('corrections', {
+        'audio_filename': audio_filename,
+        'transcription': transcription,
+        'wrong_quote': wrong_quote,
+        'correct_quote': correct_quote,
+        'pattern': pattern
+    }, audio)
     return jsonify({'status': 'ok'})
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
+    warm_up()
     app.run(host='0.0.0.0', port=port) 
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""Minimal Prometheus text-format metrics.
+
+Each gunicorn worker keeps its own values, so scrape workers individually
+(or run one worker per instance) rather than expecting them to be summed.
+"""
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers a sub-millisecond parse up to a slow long-clip transcription
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f'{self.name} expects labels {self.label_names}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}']
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        # Value is computed at scrape time (unlabelled gauges only)
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            with self._lock:
+                self._values[()] = self._function()
+        return super().render()
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labels, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.label_names, key, [('le', _format_value(bound))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.label_names, key)
+        lines.append(f'{self.name}_sum{labels} {total!r}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+REGISTRY = []
+
+
+def render(registry=None):
+    registry = REGISTRY if registry is None else registry
+    return '\n'.join(line for metric in registry for line in metric.render()) + '\n'
+
+
+def process_rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # No procfs (macOS): fall back to the peak, reported in bytes there
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageTimer:
+    """Collects per-stage durations for one request."""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def update(self, timings):
+        for name, seconds in timings.items():
+            self.record(name, seconds)
+
+    def observe(self):
+        for name, seconds in self.timings.items():
+            STAGE_SECONDS.observe(seconds, stage=name)
+
+    def as_ms(self):
+        return {name: round(seconds * 1000, 2) for name, seconds in self.timings.items()}
+
+
+STAGE_SECONDS = Histogram(
+    'voicequote_stage_seconds',
+    'Time spent per request in each stage (upload, decode, vad, queue, mel, encoder, decoder, fallback, '
+    'transcribe, parse, serialize)',
+    labels=('stage',),
+)
+REQUEST_SECONDS = Histogram(
+    'voicequote_request_seconds', 'End-to-end request handling time', labels=('endpoint',),
+)
+BATCH_SIZE = Histogram(
+    'voicequote_batch_size', 'Clips per batched model call', buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32),
+)
+AUDIO_SECONDS = Counter(
+    'voicequote_audio_seconds_total', 'Audio received, and left after silence trimming', labels=('kind',),
+)
+REPLICA_BATCHES = Counter('voicequote_replica_batches_total', 'Batches run by each model replica', labels=('replica',))
+QUOTES = Counter('voicequote_quotes_total', 'Transcriptions parsed, by matched parse_quote pattern', labels=('pattern',))
+SHED = Counter('voicequote_shed_total', 'Requests turned away or dropped by admission control', labels=('reason',))
+IN_FLIGHT = Gauge('voicequote_inflight_requests', 'Requests currently being handled')
+QUEUE_DEPTH = Gauge('voicequote_queue_depth', 'Clips waiting for the inference worker')
+JOB_DEPTH = Gauge('voicequote_job_queue_depth', 'Background jobs waiting for a job worker')
+MODEL_MEMORY = Gauge('voicequote_model_memory_bytes', 'Size of the loaded model weights')
+PROCESS_RSS = Gauge('voicequote_process_resident_memory_bytes', 'Resident set size of this worker')
+PROCESS_RSS.set_function(process_rss_bytes)
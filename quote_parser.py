@@ -0,0 +1,284 @@
+import logging
+import re
+
+from bond_resolver import BondResolver
+
+logger = logging.getLogger(__name__)
+
+# Bond type mappings with common transcription errors
+BOND_MAPPINGS = {
+    # France
+    'FRANCE': 'OAT', 'OAT': 'OAT', 'OATS': 'OAT',
+    # Italy
+    'ITALY': 'BTP', 'BTP': 'BTP', 'BTPS': 'BTP', 'BEEPS': 'BTP', 'BDP': 'BTP',
+    # Germany
+    'GERMANY': 'DBR', 'BUND': 'DBR', 'DBR': 'DBR', 'WOOD': 'DBR', 'BOND': 'DBR',
+    'BOON': 'DBR', 'BOOND': 'DBR', 'BUN': 'DBR', 'BUNT': 'DBR', 'BUNN': 'DBR',
+    'BUNDT': 'DBR', 'BUNDE': 'DBR', 'BUNDA': 'DBR', 'BUNDER': 'DBR', 'BOUND': 'DBR',
+    'BUIND': 'DBR', 'BUIN': 'DBR', 'BUINN': 'DBR', 'BUINT': 'DBR',
+    # Netherlands
+    'HOLLAND': 'NETH', 'NETHER': 'NETH', 'GUILDER': 'NETH', 'NETHERLANDS': 'NETH',
+    # Austria
+    'AUSTRIA': 'RAGB', 'RAGB': 'RAGB', 'RAG': 'RAGB',
+    # Belgium
+    'BELGIUM': 'BGB', 'BGB': 'BGB', 'BEEGEEBEE': 'BGB', 'BELG': 'BGB', 'BELGIAN': 'BGB',
+    # Portugal
+    'PORTUGAL': 'PGB', 'PGB': 'PGB', 'PEEGEEBEE': 'PGB',
+    # Spain
+    'SPAIN': 'SPGB', 'SPGB': 'SPGB', 'SPEEGEEBEE': 'SPGB',
+    # Finland
+    'FINLAND': 'RFGB', 'FINNY': 'RFGB', 'RFGB': 'RFGB',
+    'OATM': 'OAT',
+    '80': 'OAT', 'AM': 'OAT',
+}
+
+VALID_BONDS = {'OAT', 'BTP', 'DBR', 'PGB', 'SPGB', 'NETH', 'RAGB', 'RFGB', 'BGB'}
+
+MONTHS = {
+    'JANUARY': '01', 'FEBRUARY': '02', 'MARCH': '03', 'APRIL': '04',
+    'MAY': '05', 'JUNE': '06', 'JULY': '07', 'AUGUST': '08',
+    'SEPTEMBER': '09', 'OCTOBER': '10', 'NOVEMBER': '11', 'DECEMBER': '12'
+}
+
+NO_QUOTE = "No valid bond quote found"
+
+# Words that turn up in bond/month positions but must never fuzzy-match a bond
+NOT_BONDS = set(MONTHS) | {
+    'I', 'A', 'THE', 'CAN', 'BUY', 'SELL', 'BID', 'OFFER', 'AT', 'IN', 'OF',
+    'AGAINST', 'MILLION', 'PICK', 'PEAK', 'PIC', 'GIVE', 'AND', 'FOR', 'ONE',
+    # Ordinary words one edit from a bond alias that sound like it. Add to
+    # this when tests/test_bond_resolver.py finds another
+    'BEEFS', 'BENDER', 'BINDER', 'FANNY', 'FRANC', 'FRANCO', 'FRANCS', 'FRANK',
+    'FUNNY', 'GERMANE', 'NEITHER', 'NOTHER', 'SPAWN',
+}
+
+# Unknown tokens (new Whisper misspellings) are resolved by edit distance and
+# sound instead of needing another BOND_MAPPINGS entry
+BOND_RESOLVER = BondResolver(BOND_MAPPINGS, VALID_BONDS, ignore=NOT_BONDS)
+
+
+# Shared normalisation helpers
+
+def normalize_bond(token, fuzzy=True):
+    match = BOND_RESOLVER.resolve(token, fuzzy)
+    return match.bond if match else token
+
+
+def is_bond(token, fuzzy=True):
+    return BOND_RESOLVER.resolve(token, fuzzy) is not None
+
+
+def whole_word(match, group):
+    # A backtracking pattern can cut one word in two (PEEGEEBEE -> PEEGEEBE
+    # + E); only a group that is a whole word of the text may fuzzy-match
+    start, end = match.span(group)
+    text = match.string
+    return ((start == 0 or not text[start - 1].isalpha())
+            and (end == len(text) or not text[end].isalpha()))
+
+
+def match_bond(match, group):
+    return normalize_bond(match.group(group), whole_word(match, group))
+
+
+def month_number(month, pad=False):
+    return MONTHS.get(month, month.zfill(2) if pad else month)
+
+
+def quote_side(action):
+    if action in ('BUY', 'BID'):
+        return 'BID'
+    if action in ('SELL', 'OFFER'):
+        return 'OFFER'
+    return ''
+
+
+def normalize_price_type(price_type):
+    return 'PICK' if price_type in ('PEAK', 'PIC') else price_type
+
+
+# Handlers: each takes the match and the full text and returns the formatted
+# quote, or None if the bond isn't one we quote. Bond tokens go through
+# match_bond() so fuzzy matching only applies to whole words.
+
+def _outright(match, bond_group, month_group, year, action, size, price):
+    bond_type = match_bond(match, bond_group)
+    month = match.group(month_group)
+    # Whisper sometimes swaps the bond and month tokens around the slash
+    if bond_type not in VALID_BONDS and is_bond(month, whole_word(match, month_group)):
+        bond_type = match_bond(match, month_group)
+        month = match.group(bond_group)
+    if bond_type not in VALID_BONDS:
+        return None
+    out = f"{bond_type} {month_number(month, pad=True)}/{year}"
+    if price:
+        out += f" {price}"
+    quote_type = quote_side(action)
+    if quote_type:
+        out += f" {quote_type}"
+    if size:
+        out += f" IN {size}M"
+    return out
+
+
+def _bond_first(match, text):
+    return _outright(match, 1, 2, *match.groups()[2:])
+
+
+def _maturity_first(match, text):
+    return _outright(match, 3, 1, match.group(2), *match.groups()[3:])
+
+
+def _switch(match, text):
+    action, bond1, month1, year1, bond2, month2, year2, price_type, price, size = match.groups()
+    bond1 = match_bond(match, 2)
+    bond2 = match_bond(match, 5)
+    price_type = normalize_price_type(price_type)
+    # If price_type, price, or size are missing, search the rest of the text
+    if not (price_type and price and size):
+        extra = SWITCH_PRICE.search(text, match.end())
+        if extra:
+            pt, p, s = extra.groups()
+            price_type = price_type or normalize_price_type(pt)
+            price = price or p
+            size = size or s
+    if bond1 not in VALID_BONDS or bond2 not in VALID_BONDS:
+        return None
+    out = f"I CAN {action} {bond1} {month_number(month1)}/{year1} VS {bond2} {month_number(month2)}/{year2}"
+    if price_type and price:
+        out += f" {price_type} {price}"
+    if size:
+        out += f" IN {size}M"
+    return out
+
+
+def _offer(match, text):
+    _, month, year, price, size = match.groups()
+    bond_type = match_bond(match, 1)
+    if bond_type not in VALID_BONDS:
+        return None
+    return f"{bond_type} {month_number(month)}/{year} {price} OFFER IN {size}M"
+
+
+def _size_first_with_price(match, text):
+    action, size, _, month, year, price = match.groups()
+    bond_type = match_bond(match, 3)
+    if bond_type not in VALID_BONDS:
+        return None
+    quote_type = "OFFER" if action == "SELL" else "BID"
+    # Remove any decimal point from price
+    price = price.split('.')[0]
+    return f"{bond_type} {month_number(month)}/{year} {price} {quote_type} IN {size}M"
+
+
+def _can_action(match, bond_group, action, size, month, year):
+    bond_type = match_bond(match, bond_group)
+    if bond_type not in VALID_BONDS:
+        return None
+    return f"CAN {action} {size}M {bond_type} {month_number(month)}/{year}"
+
+
+def _size_first(match, text):
+    action, size, _, month, year = match.groups()
+    return _can_action(match, 3, action, size, month, year)
+
+
+def _bond_first_can(match, text):
+    _, month, year, action, size = match.groups()
+    return _can_action(match, 1, action, size, month, year)
+
+
+class QuotePattern:
+    def __init__(self, name, regex, handler, required=()):
+        self.name = name
+        self.regex = re.compile(regex)
+        self.handler = handler
+        # Literals the pattern can't match without; checked with `in` before
+        # running the regex at all
+        self.required = required
+
+
+SWITCH_PRICE = re.compile(r'(PICK|PEAK|PIC|GIVE)\s+(\d+)(?:\s+IN\s+(\d+)\s*MILLION)?')
+
+# Tried in order; the first pattern that matches decides the result, even if
+# its bond turns out not to be valid.
+PATTERNS = (
+    # Bond name and maturity first (e.g. "OAT 5/55 BID 10")
+    QuotePattern(
+        'pattern_bond_first',
+        r'([A-Z]+)\s+([A-Z]+|\d{1,2})/(\d{2}),?\s*(?:I CAN\s+)?(BUY|SELL|BID|OFFER)?\s*(\d+)M?(?:\s*(?:AT|IN)?\s*(\d+))?',
+        _bond_first, ('/',),
+    ),
+    # Maturity first, then bond name
+    QuotePattern(
+        'pattern_maturity_first',
+        r'([A-Z]+|\d{1,2})/(\d{2})\s+([A-Z]+)\s*(?:I CAN\s+)?(BUY|SELL|BID|OFFER)?\s*(\d+)M?(?:\s*(?:AT|IN)?\s*(\d+))?',
+        _maturity_first, ('/',),
+    ),
+    # Switch (e.g. "I can buy bund May 30 against BTP June 31, pick 5 in 10 million")
+    QuotePattern(
+        'switch',
+        r'I CAN (BUY|SELL)\s+(?:A\s+)?([A-Z]+)\s+(?:THE\s+)?([A-Z]+)\s+(\d{2})'
+        r'\s+AGAINST\s+(?:THE\s+)?([A-Z]+)\s+(?:THE\s+)?([A-Z]+)\s+(\d{2})'
+        r'(?:,?\s+(?:I\s+)?(PICK|PEAK|PIC|GIVE)\s+(\d+)(?:\s+IN\s+(\d+)\s*MILLION)?)?',
+        _switch, ('I CAN', 'AGAINST'),
+    ),
+    # Simple format without I'm (e.g. "OAT May 55 12 offer 72 million")
+    QuotePattern(
+        'pattern6',
+        r'([A-Z]+)\s+([A-Z]+)\s+(\d{2})\s+(\d+)\s+OFFER\s+(\d+)\s+MILLION',
+        _offer, ('OFFER', 'MILLION'),
+    ),
+    # e.g. "OAT May 55, I'm 7 offer in 12 million"
+    QuotePattern(
+        'pattern5',
+        r'([A-Z]+)\s+([A-Z]+)\s+(\d{2}),?\s+(?:I\'M|I AM)\s+(\d+)\s+OFFER\s+IN\s+(\d+)\s+MILLION',
+        _offer, ('OFFER', 'MILLION'),
+    ),
+    # e.g. "BTP September 17, 12 offer in 40 million"
+    QuotePattern(
+        'pattern4',
+        r'([A-Z]+)\s+([A-Z]+)\s+(\d{2}),?\s+(\d+)\s+OFFER\s+IN\s+(\d+)\s+MILLION',
+        _offer, ('OFFER', 'MILLION'),
+    ),
+    # e.g. "I can sell 30 million of bond September 72 at 79"
+    QuotePattern(
+        'pattern3',
+        r'I CAN (BUY|SELL)\s+(\d+)\s*(?:MILLION|M)\s*(?:OF)?\s*([A-Z]+)\s*([A-Z]+)\s*(\d{2})\s*(?:AT|IN)\s*(\d+\.?\d*)',
+        _size_first_with_price, ('I CAN',),
+    ),
+    # e.g. "I can buy 72 million of bund October 71"
+    QuotePattern(
+        'pattern2',
+        r'I CAN (BUY|SELL)\s+(\d+)\s*(?:MILLION|M)\s*(?:OF)?\s*([A-Z]+)\s*([A-Z]+)\s*(\d{2})',
+        _size_first, ('I CAN',),
+    ),
+    # Bond and maturity first, then action and size
+    QuotePattern(
+        'pattern1',
+        r'([A-Z]+)\s+([A-Z]+)\s+(\d{2}),?\s+I CAN (BUY|SELL)\s+(\d+)\s*(?:MILLION|M)',
+        _bond_first_can, ('I CAN',),
+    ),
+)
+
+
+def parse_quote(text, return_pattern=False):
+    # Convert to uppercase for standardization
+    text = text.upper()
+    for pattern in PATTERNS:
+        if not all(literal in text for literal in pattern.required):
+            continue
+        match = pattern.regex.search(text)
+        if match is None:
+            continue
+        logger.debug("%s matched %r: %s", pattern.name, text, match.groups())
+        quote = pattern.handler(match, text)
+        if quote is None:
+            break
+        if return_pattern:
+            return quote, pattern.name
+        return quote
+    logger.debug("No valid bond quote found in %r", text)
+    if return_pattern:
+        return NO_QUOTE, None
+    return NO_QUOTE
@@ -0,0 +1,64 @@
+import os
+
+# Model replicas per process, each with its own inference thread pinned to
+# its own cores. 1 (the default) leaves torch's threading alone; 'auto' makes
+# one replica per THREADS_PER_REPLICA available cores. VOICEQUOTE_REPLICA_CORES
+# lists the core sets explicitly ("0-3;4-7") and overrides both.
+REPLICAS = os.environ.get('VOICEQUOTE_REPLICAS', '1')
+REPLICA_CORES = os.environ.get('VOICEQUOTE_REPLICA_CORES', '')
+THREADS_PER_REPLICA = int(os.environ.get('VOICEQUOTE_THREADS_PER_REPLICA', 4))
+
+
+def parse_core_sets(spec):
+    # "0-3;4-7" or "0,2,4;1,3,5" -> [[0, 1, 2, 3], [4, 5, 6, 7]]
+    core_sets = []
+    for group in spec.split(';'):
+        cores = []
+        for part in group.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            first, _, last = part.partition('-')
+            cores.extend(range(int(first), int(last or first) + 1))
+        if cores:
+            core_sets.append(cores)
+    used = [core for cores in core_sets for core in cores]
+    if len(used) != len(set(used)):
+        raise ValueError(f'Replica core sets overlap: {spec!r}')
+    return core_sets
+
+
+def available_cores():
+    # The cores this process may run on, which in a container can be fewer
+    # than os.cpu_count()
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_core_sets(replicas=REPLICAS, spec=REPLICA_CORES, threads_per_replica=THREADS_PER_REPLICA):
+    """Disjoint core sets, one per replica, or [] to run a single unpinned replica."""
+    cores = available_cores()
+    if spec:
+        core_sets = parse_core_sets(spec)
+        unavailable = sorted({core for cores_ in core_sets for core in cores_} - set(cores))
+        if unavailable:
+            raise ValueError(f'Replica cores {unavailable} are not available to this process '
+                             f'(available: {cores}): {spec!r}')
+        return core_sets
+    if str(replicas) == 'auto':
+        count = len(cores) // max(1, threads_per_replica)
+    else:
+        count = int(replicas)
+    count = min(max(1, count), len(cores))
+    if count == 1:
+        return []
+    size = len(cores) // count
+    return [cores[i * size:(i + 1) * size] for i in range(count)]
+
+
+def pin_current_thread(cores):
+    # Threads the calling thread starts afterwards (torch's OpenMP pool)
+    # inherit the mask
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
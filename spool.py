@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Recent uploads are kept in memory so /save_training_data and /save_correction
+# only need the audio_filename, not a second copy of the audio.
+SPOOL_MAX_BYTES = int(float(os.environ.get('VOICEQUOTE_SPOOL_MAX_MB', 64)) * 1024 * 1024)
+SPOOL_TTL = float(os.environ.get('VOICEQUOTE_SPOOL_TTL', 900))
+
+
+class AudioSpool:
+    """Bounded, TTL-expiring map of audio_filename -> uploaded bytes.
+
+    Oldest entries are evicted first once the total size passes max_bytes.
+    """
+
+    def __init__(self, max_bytes=SPOOL_MAX_BYTES, ttl=SPOOL_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (data, time.monotonic() + self.ttl)
+            self.size += len(data)
+            self._evict()
+
+    def get(self, key):
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            self._remove(key)
+            return entry[0] if entry else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.size -= len(entry[0])
+
+    def _evict(self):
+        now = time.monotonic()
+        # Entries are in insertion order, so expiry times are increasing too
+        while self._entries:
+            key, (data, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now and self.size <= self.max_bytes:
+                break
+            self._remove(key)
@@ -1,2 +1,2 @@
 #!/usr/bin/env bash
-gunicorn main:app 
\ No newline at end of file
+gunicorn -c gunicorn_config.py main:app
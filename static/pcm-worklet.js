@@ -0,0 +1,68 @@
+// Runs on the audio rendering thread: downmixes the microphone to mono,
+// downsamples it to 16 kHz and posts 16-bit PCM back to the page in ~100 ms
+// blocks, so the server gets exactly the format Whisper wants.
+const TARGET_RATE = 16000;
+const BLOCK_SAMPLES = TARGET_RATE / 10;
+
+class PcmRecorder extends AudioWorkletProcessor {
+    constructor() {
+        super();
+        // Input samples per output sample, e.g. 3 at 48 kHz
+        this.ratio = sampleRate / TARGET_RATE;
+        this.position = 0;
+        this.sum = 0;
+        this.count = 0;
+        this.block = new Int16Array(BLOCK_SAMPLES);
+        this.filled = 0;
+        this.port.onmessage = (event) => {
+            if (event.data === 'flush') {
+                this.flush();
+                this.port.postMessage('flushed');
+            }
+        };
+    }
+
+    process(inputs) {
+        const channels = inputs[0];
+        if (!channels || channels.length === 0) {
+            return true;
+        }
+        const frames = channels[0].length;
+        for (let i = 0; i < frames; i++) {
+            let sample = 0;
+            for (let c = 0; c < channels.length; c++) {
+                sample += channels[c][i];
+            }
+            // Averaging every input sample that falls in one output period is
+            // a box low-pass, enough to keep speech from aliasing
+            this.sum += sample / channels.length;
+            this.count++;
+            this.position++;
+            if (this.position >= this.ratio) {
+                this.position -= this.ratio;
+                this.emit(this.sum / this.count);
+                this.sum = 0;
+                this.count = 0;
+            }
+        }
+        return true;
+    }
+
+    emit(sample) {
+        const clipped = Math.max(-1, Math.min(1, sample));
+        this.block[this.filled++] = clipped < 0 ? clipped * 0x8000 : clipped * 0x7fff;
+        if (this.filled === BLOCK_SAMPLES) {
+            this.flush();
+        }
+    }
+
+    flush() {
+        if (this.filled > 0) {
+            const pcm = this.block.slice(0, this.filled);
+            this.port.postMessage(pcm, [pcm.buffer]);
+            this.filled = 0;
+        }
+    }
+}
+
+registerProcessor('pcm-recorder', PcmRecorder);
@@ -1,9 +1,21 @@
-let mediaRecorder;
-let audioChunks = [];
+let recorder;
+let micStream;
 let isRecording = false;
+let streamId = null;
+let streamSeq = 0;
+let streamChain = Promise.resolve();
+// Set when the server rejects a chunk (e.g. another worker took it and has
+// never heard of this stream); the clip is then uploaded whole instead
+let streamFailed = false;
 const recordButton = document.getElementById('recordButton');
 const quoteText = document.querySelector('.quote-text');
 
+// How often recorded audio is sent to the server while streaming
+const STREAM_CHUNK_MS = 300;
+// What Whisper wants; the worklet downsamples to this so the server doesn't have to
+const SAMPLE_RATE = 16000;
+const PCM_WORKLET_URL = '/static/pcm-worklet.js';
+
 // Function to copy text to clipboard
 async function copyToClipboard(text) {
     try {
@@ -19,44 +31,211 @@ async function copyToClipboard(text) {
     }
 }
 
+async function showResult(data) {
+    const quote = data.quote || data.transcription || '+QUOTE';
+    quoteText.classList.remove('provisional');
+    quoteText.textContent = quote;
+
+    // Automatically copy the quote to clipboard
+    if (quote !== '+QUOTE') {
+        await copyToClipboard(quote);
+    }
+}
+
+async function openStream() {
+    try {
+        const response = await fetch('/stream', { method: 'POST' });
+        if (!response.ok) {
+            return null;
+        }
+        const data = await response.json();
+        return data.stream_id;
+    } catch (error) {
+        return null;
+    }
+}
+
+async function sendChunk(id, seq, chunk) {
+    // The server only appends the chunk and answers with the latest partial,
+    // so waiting for each response keeps chunks in order without holding
+    // anything up
+    if (streamFailed) {
+        return;
+    }
+    try {
+        const response = await fetch(`/stream/${id}/chunk?seq=${seq}`, {
+            method: 'POST',
+            body: chunk
+        });
+        if (!response.ok) {
+            streamFailed = true;
+            return;
+        }
+        const data = await response.json();
+        // Only show a provisional quote once the server says it has settled
+        if (isRecording && data.stable && data.quote) {
+            quoteText.classList.add('provisional');
+            quoteText.textContent = data.quote;
+        }
+    } catch (error) {
+        streamFailed = true;
+        console.error('Failed to stream chunk: ', error);
+    }
+}
+
+async function finishStream(id, seq) {
+    // null means the stream is unusable and the clip should be uploaded whole
+    try {
+        const response = await fetch(`/stream/${id}/finish?seq=${seq}`, { method: 'POST' });
+        return response.ok ? response.json() : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function recordingFilename(type) {
+    if (type.includes('wav')) return 'recording.wav';
+    if (type.includes('ogg')) return 'recording.ogg';
+    if (type.includes('mp4')) return 'recording.m4a';
+    return 'recording.webm';
+}
+
+async function uploadRecording(audioBlob) {
+    const formData = new FormData();
+    formData.append('file', audioBlob, recordingFilename(audioBlob.type));
+    const response = await fetch('/transcribe', {
+        method: 'POST',
+        body: formData
+    });
+    return response.json();
+}
+
+function wavHeader(dataBytes) {
+    // 16-bit mono PCM at SAMPLE_RATE. A streamed upload doesn't know its
+    // length yet, so it gets 0xFFFFFFFF sizes and the server fills them in.
+    const view = new DataView(new ArrayBuffer(44));
+    const writeString = (offset, text) => {
+        for (let i = 0; i < text.length; i++) {
+            view.setUint8(offset + i, text.charCodeAt(i));
+        }
+    };
+    const streamed = dataBytes === undefined;
+    writeString(0, 'RIFF');
+    view.setUint32(4, streamed ? 0xFFFFFFFF : 36 + dataBytes, true);
+    writeString(8, 'WAVE');
+    writeString(12, 'fmt ');
+    view.setUint32(16, 16, true);
+    view.setUint16(20, 1, true);
+    view.setUint16(22, 1, true);
+    view.setUint32(24, SAMPLE_RATE, true);
+    view.setUint32(28, SAMPLE_RATE * 2, true);
+    view.setUint16(32, 2, true);
+    view.setUint16(34, 16, true);
+    writeString(36, 'data');
+    view.setUint32(40, streamed ? 0xFFFFFFFF : dataBytes, true);
+    return view.buffer;
+}
+
+async function startPcmRecorder(stream, onChunk) {
+    // Capture through an AudioWorklet that hands back 16 kHz 16-bit PCM,
+    // uploaded as WAV: a fraction of the size of 48 kHz audio and decoded
+    // on the server without ffmpeg or resampling
+    const context = new AudioContext();
+    await context.audioWorklet.addModule(PCM_WORKLET_URL);
+    const source = context.createMediaStreamSource(stream);
+    const node = new AudioWorkletNode(context, 'pcm-recorder', { numberOfOutputs: 0 });
+    const chunks = [];
+    let unsent = [wavHeader()];
+    let unsentSamples = 0;
+    let flushed = null;
+
+    const sendPending = () => {
+        if (unsentSamples > 0) {
+            onChunk(new Blob(unsent, { type: 'audio/wav' }));
+            unsent = [];
+            unsentSamples = 0;
+        }
+    };
+    node.port.onmessage = (event) => {
+        if (event.data === 'flushed') {
+            flushed();
+            return;
+        }
+        chunks.push(event.data);
+        unsent.push(event.data);
+        unsentSamples += event.data.length;
+    };
+    const timer = setInterval(sendPending, STREAM_CHUNK_MS);
+    source.connect(node);
+
+    return {
+        async stop() {
+            // Collect the worklet's last partial block before closing
+            await new Promise((resolve) => {
+                flushed = resolve;
+                node.port.postMessage('flush');
+            });
+            clearInterval(timer);
+            sendPending();
+            source.disconnect();
+            await context.close();
+            const dataBytes = chunks.reduce((total, chunk) => total + chunk.byteLength, 0);
+            return new Blob([wavHeader(dataBytes), ...chunks], { type: 'audio/wav' });
+        }
+    };
+}
+
+function startMediaRecorder(stream, onChunk, timeslice) {
+    // Fallback for browsers without AudioWorklet: the browser's own container
+    // (usually Opus in WebM), which the server decodes with ffmpeg
+    const mediaRecorder = new MediaRecorder(stream);
+    const chunks = [];
+    mediaRecorder.ondataavailable = (event) => {
+        chunks.push(event.data);
+        onChunk(event.data);
+    };
+    mediaRecorder.start(timeslice);
+    return {
+        stop() {
+            return new Promise((resolve) => {
+                mediaRecorder.onstop = () => resolve(new Blob(chunks, { type: mediaRecorder.mimeType }));
+                mediaRecorder.stop();
+            });
+        }
+    };
+}
+
+async function startRecorder(stream, onChunk, timeslice) {
+    if (window.AudioWorkletNode) {
+        try {
+            return await startPcmRecorder(stream, onChunk);
+        } catch (error) {
+            console.error('PCM capture unavailable, using MediaRecorder: ', error);
+        }
+    }
+    return startMediaRecorder(stream, onChunk, timeslice);
+}
+
 recordButton.addEventListener('click', async () => {
     if (!isRecording) {
         // Start recording
         try {
-            const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-            mediaRecorder = new MediaRecorder(stream);
-            audioChunks = [];
-            
-            mediaRecorder.ondataavailable = (event) => {
-                audioChunks.push(event.data);
-            };
+            micStream = await navigator.mediaDevices.getUserMedia({ audio: true });
+            streamSeq = 0;
+            streamChain = Promise.resolve();
+            streamFailed = false;
+            // Fall back to uploading the whole clip if streaming isn't available
+            streamId = await openStream();
 
-            mediaRecorder.onstop = async () => {
-                const audioBlob = new Blob(audioChunks, { type: 'audio/wav' });
-                const formData = new FormData();
-                formData.append('file', audioBlob, 'recording.wav');
-                
-                quoteText.textContent = 'Processing...';
-                
-                try {
-                    const response = await fetch('/transcribe', {
-                        method: 'POST',
-                        body: formData
-                    });
-                    const data = await response.json();
-                    const quote = data.quote || data.transcription || '+QUOTE';
-                    quoteText.textContent = quote;
-                    
-                    // Automatically copy the quote to clipboard
-                    if (quote !== '+QUOTE') {
-                        await copyToClipboard(quote);
-                    }
-                } catch (error) {
-                    quoteText.textContent = 'Error: Try again';
+            const onChunk = (chunk) => {
+                if (streamId && !streamFailed) {
+                    // Chunks must reach the server in order
+                    const id = streamId;
+                    const seq = streamSeq++;
+                    streamChain = streamChain.then(() => sendChunk(id, seq, chunk));
                 }
             };
-
-            mediaRecorder.start();
+            recorder = await startRecorder(micStream, onChunk, streamId ? STREAM_CHUNK_MS : undefined);
             isRecording = true;
             recordButton.classList.add('recording');
             recordButton.textContent = 'STOP';
@@ -66,9 +245,29 @@ recordButton.addEventListener('click', async () => {
         }
     } else {
         // Stop recording
-        mediaRecorder.stop();
         isRecording = false;
         recordButton.classList.remove('recording');
         recordButton.textContent = 'QUOTE!';
+        quoteText.classList.remove('provisional');
+        quoteText.textContent = 'Processing...';
+
+        try {
+            const audioBlob = await recorder.stop();
+            micStream.getTracks().forEach((track) => track.stop());
+            let data = null;
+            if (streamId) {
+                // Only outstanding chunk uploads to wait for, never partials
+                await streamChain;
+                if (!streamFailed) {
+                    data = await finishStream(streamId, streamSeq);
+                }
+            }
+            if (!data) {
+                data = await uploadRecording(audioBlob);
+            }
+            await showResult(data);
+        } catch (error) {
+            quoteText.textContent = 'Error: Try again';
+        }
     }
-}); 
\ No newline at end of file
+});
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+import uuid
+
+from audio import SAMPLE_RATE, decode_audio
+
+# Only the most recent STREAM_WINDOW_SECONDS of audio are re-transcribed for partials
+STREAM_WINDOW_SECONDS = float(os.environ.get('VOICEQUOTE_STREAM_WINDOW_SECONDS', 15))
+# Sessions with no chunk for this long are dropped
+STREAM_IDLE_TIMEOUT = float(os.environ.get('VOICEQUOTE_STREAM_IDLE_TIMEOUT', 60))
+MAX_STREAM_SESSIONS = int(os.environ.get('VOICEQUOTE_MAX_STREAM_SESSIONS', 64))
+
+
+class StreamError(Exception):
+    pass
+
+
+class StreamSession:
+    def __init__(self, profile=None):
+        self.id = uuid.uuid4().hex
+        self.profile = profile
+        self.data = bytearray()
+        self.next_seq = 0
+        self.last_seen = time.monotonic()
+        self.partial = ''
+        self.quote = None
+        self.pattern = None
+        self.stable = False
+        self.closed = False
+        # The partial transcription in the inference queue, if any
+        self.pending = None
+        self.lock = threading.Lock()
+        self.transcribing = threading.Lock()
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def append(self, seq, chunk):
+        # Returns the total bytes received so far
+        with self.lock:
+            if seq is not None and seq != self.next_seq:
+                raise StreamError(f'Expected chunk {self.next_seq}, got {seq}')
+            self.data.extend(chunk)
+            self.next_seq += 1
+            self.last_seen = time.monotonic()
+            return len(self.data)
+
+    def contents(self):
+        with self.lock:
+            return bytes(self.data)
+
+    def submit_partial(self, submit):
+        # submit() queues the transcription and returns its Future; None if
+        # the stream has been closed in the meantime
+        with self.lock:
+            if self.closed:
+                return None
+            self.pending = submit()
+            return self.pending
+
+    def close(self):
+        # Drop a partial that hasn't reached the model yet so the final
+        # transcription doesn't queue behind it
+        with self.lock:
+            self.closed = True
+            if self.pending is not None:
+                self.pending.cancel()
+
+    def window(self, data):
+        audio = decode_audio(data)
+        return audio[-int(STREAM_WINDOW_SECONDS * SAMPLE_RATE):]
+
+    def update(self, transcription, quote, pattern):
+        # A provisional quote is stable once two consecutive partials agree on it
+        with self.lock:
+            self.stable = pattern is not None and quote == self.quote
+            self.partial = transcription
+            self.quote = quote
+            self.pattern = pattern
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'stream_id': self.id,
+                'transcription': self.partial,
+                'quote': self.quote,
+                'pattern': self.pattern,
+                'stable': self.stable,
+            }
+
+
+class StreamRegistry:
+    def __init__(self, max_sessions=MAX_STREAM_SESSIONS, idle_timeout=STREAM_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def open(self, profile=None):
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                raise StreamError('Too many open streams')
+            session = StreamSession(profile)
+            self._sessions[session.id] = session
+            return session
+
+    def get(self, stream_id):
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(stream_id)
+        if session is None:
+            raise KeyError(stream_id)
+        return session
+
+    def close(self, stream_id):
+        with self._lock:
+            session = self._sessions.pop(stream_id, None)
+        if session is not None:
+            session.close()
+        return session
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for stream_id in [k for k, s in self._sessions.items() if s.last_seen < cutoff]:
+            self._sessions.pop(stream_id).close()
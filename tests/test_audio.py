@@ -0,0 +1,60 @@
+import io
+import struct
+import wave
+
+import numpy as np
+import pytest
+
+from audio import SAMPLE_RATE, WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_PCM, AudioDecodeError, decode_audio
+
+
+def wav(seconds=0.5, sample_rate=SAMPLE_RATE, channels=1):
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    samples = (0.3 * np.sin(2 * np.pi * 200 * t) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(np.repeat(samples, channels).tobytes())
+    return buffer.getvalue()
+
+
+def raw_wav(format_tag=WAVE_FORMAT_PCM, channels=1, sample_rate=SAMPLE_RATE, block_align=2, bits=16,
+            samples=b'\x00\x01' * 64):
+    fmt = struct.pack('<HHIIHH', format_tag, channels, sample_rate, sample_rate * block_align, block_align, bits)
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', len(samples)) + samples
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+@pytest.mark.parametrize('sample_rate,channels', [(16000, 1), (48000, 2), (8000, 1), (44100, 1)])
+def test_wav_decodes_to_mono_16k(sample_rate, channels):
+    audio = decode_audio(wav(0.5, sample_rate, channels))
+    assert audio.dtype == np.float32
+    assert abs(len(audio) - SAMPLE_RATE // 2) <= 1
+    assert 0.25 < np.abs(audio).max() < 0.35
+
+
+def test_float_wav():
+    samples = np.full(160, 0.5, '<f4').tobytes()
+    audio = decode_audio(raw_wav(WAVE_FORMAT_IEEE_FLOAT, block_align=4, bits=32, samples=samples))
+    assert len(audio) == 160 and np.allclose(audio, 0.5)
+
+
+@pytest.mark.parametrize('header', [
+    dict(block_align=3),
+    dict(block_align=1),
+    dict(channels=2, block_align=2),
+    dict(channels=0, block_align=0),
+    dict(sample_rate=0),
+    dict(sample_rate=1),
+    dict(format_tag=WAVE_FORMAT_IEEE_FLOAT, bits=32, block_align=2),
+])
+def test_malformed_wav_header_is_a_decode_error(header):
+    with pytest.raises(AudioDecodeError):
+        decode_audio(raw_wav(**header))
+
+
+def test_empty_upload_is_a_decode_error():
+    with pytest.raises(AudioDecodeError):
+        decode_audio(b'')
@@ -0,0 +1,93 @@
+import string
+
+import pytest
+
+from quote_parser import BOND_MAPPINGS, BOND_RESOLVER, NO_QUOTE, VALID_BONDS, parse_quote
+
+# Misspellings Whisper has produced (or is one slip away from) that aren't
+# BOND_MAPPINGS entries but must still resolve
+MISSPELLINGS = {
+    'BELGUIM': 'BGB', 'BELGIAM': 'BGB', 'BEEGEEBE': 'BGB',
+    'PORTUGUL': 'PGB', 'PORTUGEL': 'PGB', 'PEEGEEBE': 'PGB',
+    'SPAINE': 'SPGB', 'SPEEGEEBE': 'SPGB',
+    'HOLAND': 'NETH', 'NETHERLENDS': 'NETH', 'NETHERLNDS': 'NETH',
+    'AUSTRIAH': 'RAGB', 'AUSTRA': 'RAGB',
+    'FINLANT': 'RFGB', 'FINNLAND': 'RFGB',
+    'FRANSE': 'OAT', 'FRANCEE': 'OAT',
+    'ITALI': 'BTP', 'ITALEY': 'BTP',
+    'GERMAN': 'DBR', 'GERMANI': 'DBR', 'BUNDY': 'DBR', 'BOUNDT': 'DBR', 'BUINDT': 'DBR',
+}
+
+# Ordinary words that must never become a bond. The first lines are words
+# an earlier, looser resolver turned into bonds.
+COMMON_WORDS = '''
+BUT OUT GOOD FOOD WORD FOUND SOUND ROUND POUND BOOK BOOT BAND BENT BUST FINE
+PAIN SPIN BELT RAGE NETS BONDS WOODS WOODY BUNNY BUNDLE BLIND BEHIND BOUNTY
+FRANC FRANCS FRANK FRANCO BEEFS BENDER BINDER FANNY FUNNY GERMANE NEITHER SPAWN
+THANK THANKS HELLO SORRY PLEASE YEAH RIGHT OKAY WHAT WHERE WHICH THERE THEIR
+THESE THOSE ABOUT AFTER AGAIN ALWAYS AROUND BECAUSE BEFORE BEING BELOW BETTER
+BETWEEN BOTH COULD EVERY FIRST FOUND GOING GREAT HAVING MAYBE MIGHT NEVER OTHER
+PEOPLE PLACE POINT PRICE QUITE REALLY SHOULD SINCE SOMETHING STILL THINK THREE
+TODAY UNDER UNTIL WHILE WORLD WOULD WRITE YEARS ABOVE ACROSS ALREADY ANOTHER
+BASIS BLOCK BONUS BOUGHT BRING BUYER CALLS CHECK CLOSE COUPON CURVE DEALER DESK
+EIGHT ELEVEN FIFTEEN FIFTY FIVES FORTY FUNDS HUNDRED LEVEL LINES MARKET MONEY
+NINETY OFFERS PAPER POINTS QUOTE RATES SELLER SEVEN SEVENTY SIXTY SPREAD SWITCH
+TEN TWENTY THIRTY TRADE TRADER TWELVE YIELD BIDDING BIDS OFFERED SELLING BUYING
+SPEAK SPENT PAINT SAINT FINAL FINISH FINANCE BELONG BELGIANS GERMANS
+HOLLOW HOLIDAY NETWORK NOTHING NOTHER AUSTERE AUSTRALIA ITALIC PORTAL PORTUGUESE
+BOUNCE BOUNDARY BOUNDS BUNDLES WONDER WOODEN
+'''.split()
+
+
+@pytest.mark.parametrize('token', sorted(set(BOND_MAPPINGS) | VALID_BONDS))
+def test_aliases_resolve_exactly(token):
+    assert BOND_RESOLVER.resolve(token) == (BOND_MAPPINGS.get(token, token), token, 1.0)
+
+
+@pytest.mark.parametrize('token,bond', sorted(MISSPELLINGS.items()))
+def test_misspellings_resolve(token, bond):
+    match = BOND_RESOLVER.resolve(token)
+    assert match is not None and match.bond == bond
+    assert BOND_RESOLVER.min_confidence <= match.confidence < 1.0
+
+
+@pytest.mark.parametrize('token', sorted(set(COMMON_WORDS) - set(BOND_MAPPINGS)))
+def test_common_words_do_not_resolve(token):
+    assert BOND_RESOLVER.resolve(token) is None
+
+
+def test_short_tokens_are_exact_only():
+    for token in ('BUNS', 'OATH', 'BTPP', 'RAGS', 'SPAN', 'NETT'):
+        assert BOND_RESOLVER.resolve(token) is None
+
+
+def test_no_fuzzy_match_on_pieces_of_words():
+    assert BOND_RESOLVER.resolve('PEEGEEBE', fuzzy=False) is None
+    assert parse_quote('I can buy 59 million of PEEGEEBEE 10 95') == NO_QUOTE
+
+
+def test_common_words_in_the_bond_slot_give_no_quote():
+    assert parse_quote('Thank you. Good 10/31 offer 5') == NO_QUOTE
+    for word in COMMON_WORDS:
+        if word not in BOND_MAPPINGS:
+            assert parse_quote(f'{word} 10/31 offer 5') == NO_QUOTE, word
+
+
+def test_every_fuzzy_match_is_one_sound_alike_edit():
+    # Exhaustive over single edits of every fuzzy-indexed alias, so a looser
+    # resolver can't slip through with matches the word lists don't cover
+    from bond_resolver import edit_distance, phonetic_key
+    for alias in BOND_RESOLVER._keys:
+        variants = set()
+        for i in range(len(alias) + 1):
+            variants.update(alias[:i] + c + alias[i:] for c in string.ascii_uppercase)
+        for i in range(len(alias)):
+            variants.add(alias[:i] + alias[i + 1:])
+            variants.update(alias[:i] + c + alias[i + 1:] for c in string.ascii_uppercase)
+        for variant in variants:
+            match = BOND_RESOLVER.resolve(variant)
+            if match is None or match.confidence == 1.0:
+                continue
+            assert len(variant) >= BOND_RESOLVER.min_fuzzy_length
+            assert edit_distance(variant, match.alias) == 1
+            assert phonetic_key(variant) == phonetic_key(match.alias)
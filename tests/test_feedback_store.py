@@ -0,0 +1,41 @@
+import pytest
+
+from feedback_store import FeedbackStore, stored_filename
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FeedbackStore(str(tmp_path / 'feedback.db'), str(tmp_path))
+
+
+def training_row(filename):
+    return {'audio_filename': filename, 'transcription': 'OAT 5/55 bid 10',
+            'quote': 'OAT 05/55 BID IN 10M', 'pattern': 'pattern_bond_first'}
+
+
+@pytest.mark.parametrize('name', ['', 'x/', '.', '..', 'a/..', '/', 'a\0b'])
+def test_unusable_filenames_are_rejected(store, name):
+    assert stored_filename(name) is None
+    with pytest.raises(ValueError):
+        store.add('training', training_row(name), b'RIFF')
+
+
+def test_directories_are_stripped(store, tmp_path):
+    assert stored_filename('../../etc/clip.wav') == 'clip.wav'
+    store.add('training', training_row('../../clip.wav'), b'RIFF')
+    assert store.flush(5)
+    assert [row['audio_filename'] for row in store.find('training')] == ['clip.wav']
+    with open(store.audio_path('training', 'clip.wav'), 'rb') as f:
+        assert f.read() == b'RIFF'
+
+
+def test_unwritable_audio_only_loses_its_own_row(store, tmp_path):
+    # A directory where the file should go makes that one write fail
+    (tmp_path / 'blocked').mkdir()
+    store.audio_path = lambda kind, filename: str(
+        tmp_path / 'blocked' if filename == 'bad.wav' else tmp_path / filename)
+    store.batch_wait = 1.0
+    for name in ('good1.wav', 'bad.wav', 'good2.wav'):
+        store.add('training', training_row(name), b'RIFF')
+    assert store.flush(5)
+    assert [row['audio_filename'] for row in store.find('training')] == ['good1.wav', 'good2.wav']
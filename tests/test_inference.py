@@ -0,0 +1,79 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from inference import DeadlineExceeded, InferenceQueue, QueueFull
+
+
+class FakeBackend:
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+        self.calls = 0
+
+    def transcribe_batch(self, clips, profile=None):
+        self.calls += 1
+        time.sleep(self.seconds)
+        return [{'text': 'OAT 5/55 bid 10'} for _ in clips]
+
+
+def clip():
+    return np.zeros(1600, np.float32)
+
+
+def test_transcribes():
+    inference = InferenceQueue(FakeBackend(), core_sets=[])
+    assert inference.transcribe(clip())['text'] == 'OAT 5/55 bid 10'
+
+
+def test_deadline_runs_from_request_arrival():
+    backend = FakeBackend()
+    inference = InferenceQueue(backend, deadline=1, core_sets=[])
+    with pytest.raises(DeadlineExceeded):
+        inference.transcribe(clip(), started_at=time.monotonic() - 2)
+    assert backend.calls == 0
+    assert inference.transcribe(clip(), started_at=time.monotonic() - 0.5)['text']
+
+
+def test_deadline_expires_while_queued():
+    backend = FakeBackend(0.5)
+    inference = InferenceQueue(backend, max_batch_size=1, deadline=0.3, core_sets=[])
+    busy = inference.submit(clip(), deadline=0)
+    time.sleep(0.05)
+    with pytest.raises(DeadlineExceeded):
+        inference.transcribe(clip(), started_at=time.monotonic() - 0.2)
+    busy.result()
+
+
+def test_full_queue_is_refused():
+    release = threading.Event()
+
+    class Blocked(FakeBackend):
+        def transcribe_batch(self, clips, profile=None):
+            release.wait(5)
+            return super().transcribe_batch(clips, profile)
+
+    inference = InferenceQueue(Blocked(), max_batch_size=1, max_depth=2, core_sets=[])
+    futures = [inference.submit(clip(), deadline=0)]
+    time.sleep(0.05)
+    futures += [inference.submit(clip(), deadline=0) for _ in range(2)]
+    with pytest.raises(QueueFull):
+        inference.admit()
+    with pytest.raises(QueueFull):
+        inference.submit(clip(), deadline=0)
+    release.set()
+    assert all(future.result(5)['text'] for future in futures)
+
+
+def test_replica_that_fails_to_start_fails_warm_up():
+    class Unpinnable(FakeBackend):
+        def set_num_threads(self, count):
+            raise OSError(22, 'Invalid argument')
+
+        def replicate(self):
+            return Unpinnable()
+
+    inference = InferenceQueue(Unpinnable(), core_sets=[[0], [0]])
+    with pytest.raises(RuntimeError, match='replica 0 failed to start'):
+        inference.warm_up(clip())
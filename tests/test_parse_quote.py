@@ -0,0 +1,58 @@
+import contextlib
+import io
+import os
+import random
+
+import pytest
+
+import legacy_quote_parser
+from quote_parser import BOND_MAPPINGS, NO_QUOTE, parse_quote
+
+# Transcripts fuzzed from this vocabulary must parse exactly as they did
+# before the pattern table. Fuzzy bond matching is a deliberate change, so
+# every bond-like token here is an exact alias or a word that resolves to
+# nothing. Set VOICEQUOTE_FUZZ_SAMPLES lower for a quicker run.
+FUZZ_SAMPLES = int(os.environ.get('VOICEQUOTE_FUZZ_SAMPLES', 300000))
+FUZZ_WORDS = sorted(BOND_MAPPINGS) + [
+    'XYZ', 'GOOD', 'THANKS', 'MAY', 'JUNE', 'OCTOBER', 'SEPTEMBER', '5/55', '10/31', 'MAY/30',
+    'FRANCE/29', 'I CAN', 'BUY', 'SELL', 'BID', 'OFFER', 'IN', 'AT', 'MILLION', 'M', 'OF',
+    'AGAINST', 'THE', 'A', 'PICK', 'PEAK', 'PIC', 'GIVE', "I'M", 'I AM', '12', '72', '3', '30',
+    '7.5', ',', '55', '31', '10', '95',
+]
+
+EXAMPLES = [
+    ('OAT 5/55 bid 10 at 98', 'OAT 05/55 98 BID IN 10M', 'pattern_bond_first'),
+    ('5/55 OAT offer 10', 'OAT 05/55 OFFER IN 10M', 'pattern_maturity_first'),
+    ('MAY/30 BUND 10', 'DBR 05/30 IN 10M', 'pattern_maturity_first'),
+    ('I can buy bund May 30 against BTP June 31, pick 5 in 10 million',
+     'I CAN BUY DBR 05/30 VS BTP 06/31 PICK 5 IN 10M', 'switch'),
+    ('OAT May 55 12 offer 72 million', 'OAT 05/55 12 OFFER IN 72M', 'pattern6'),
+    ("OAT May 55, I'm 7 offer in 12 million", 'OAT 05/55 7 OFFER IN 12M', 'pattern5'),
+    ('BTP September 17, 12 offer in 40 million', 'BTP 09/17 12 OFFER IN 40M', 'pattern4'),
+    ('I can sell 30 million of bond September 72 at 79', 'DBR 09/72 79 OFFER IN 30M', 'pattern3'),
+    ('I can buy 72 million of bund October 71', 'CAN BUY 72M DBR 10/71', 'pattern2'),
+    ('Bund October 71, I can buy 72 million', 'CAN BUY 72M DBR 10/71', 'pattern1'),
+    ('hello there', NO_QUOTE, None),
+]
+
+
+def legacy_parse(text):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return legacy_quote_parser.parse_quote(text, True)
+
+
+@pytest.mark.parametrize('text,quote,pattern', EXAMPLES)
+def test_examples(text, quote, pattern):
+    assert parse_quote(text, return_pattern=True) == (quote, pattern)
+    assert parse_quote(text) == quote
+    assert legacy_parse(text) == (quote, pattern)
+
+
+def test_matches_legacy_parser_on_fuzzed_transcripts():
+    rng = random.Random(1)
+    mismatches = []
+    for _ in range(FUZZ_SAMPLES):
+        text = ' '.join(rng.choice(FUZZ_WORDS) for _ in range(rng.randint(3, 14)))
+        if parse_quote(text, return_pattern=True) != legacy_parse(text):
+            mismatches.append(text)
+    assert not mismatches, f'{len(mismatches)} of {FUZZ_SAMPLES} differ, e.g. {mismatches[:5]}'
@@ -0,0 +1,24 @@
+import pytest
+
+from replicas import available_cores, parse_core_sets, plan_core_sets
+
+
+def test_parse_core_sets():
+    assert parse_core_sets('0-3;4-7') == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert parse_core_sets('0,2;1,3') == [[0, 2], [1, 3]]
+    with pytest.raises(ValueError):
+        parse_core_sets('0-3;3-5')
+
+
+def test_explicit_cores_must_be_available():
+    cores = available_cores()
+    assert plan_core_sets(spec=str(cores[0])) == [[cores[0]]]
+    with pytest.raises(ValueError, match='not available'):
+        plan_core_sets(spec=f'{cores[0]};{max(cores) + 1000}')
+
+
+def test_auto_uses_available_cores_once():
+    core_sets = plan_core_sets('auto', '', 1)
+    used = [core for cores in core_sets for core in cores]
+    assert len(used) == len(set(used))
+    assert set(used) <= set(available_cores())
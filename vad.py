@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+
+from audio import SAMPLE_RATE
+
+# Energy-based voice activity detection, run on the decoded clip before it is
+# queued for the model. Set VOICEQUOTE_VAD=0 to send clips through untouched.
+VAD_ENABLED = os.environ.get('VOICEQUOTE_VAD', '1') == '1'
+# Speech kept on either side of each voiced region; internal pauses longer
+# than twice this are cut down to twice this
+VAD_PAD_MS = float(os.environ.get('VOICEQUOTE_VAD_PAD_MS', 150))
+# How far above the clip's noise floor a frame must be to count as speech
+VAD_MARGIN_DB = float(os.environ.get('VOICEQUOTE_VAD_MARGIN_DB', 15))
+# Names the trimming in effect, for caches of transcripts of trimmed audio
+VAD_SETTINGS = f'pad{VAD_PAD_MS:g}ms-margin{VAD_MARGIN_DB:g}dB' if VAD_ENABLED else 'off'
+
+FRAME_MS = 20
+# The speech threshold never drops below MIN_DB (so a silent clip stays
+# silent) or rises above MAX_DB (so a clip that is all speech, with no quiet
+# frames to measure a floor from, still counts as speech)
+MIN_DB = -55.0
+MAX_DB = -35.0
+# Less voiced audio than this is treated as no speech at all
+MIN_SPEECH_MS = 100
+
+
+def speech_mask(audio, margin_db=VAD_MARGIN_DB, pad_ms=VAD_PAD_MS):
+    # One bool per FRAME_MS frame (the last partial frame counts as a frame)
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    frames = -(-len(audio) // frame)
+    padded = np.zeros(frames * frame, dtype=np.float32)
+    padded[:len(audio)] = audio
+    power = np.einsum('ij,ij->i', padded.reshape(frames, frame), padded.reshape(frames, frame)) / frame
+    db = 10 * np.log10(power + 1e-10)
+    threshold = np.clip(np.percentile(db, 10) + margin_db, MIN_DB, MAX_DB)
+    voiced = db > threshold
+    if voiced.sum() * FRAME_MS < MIN_SPEECH_MS:
+        return np.zeros(frames, dtype=bool)
+    # Widen every voiced frame by the padding on both sides
+    pad = int(round(pad_ms / FRAME_MS))
+    if pad:
+        voiced = np.convolve(voiced, np.ones(2 * pad + 1), mode='same') > 0
+    return voiced
+
+
+def trim_silence(audio):
+    """Drop leading/trailing silence and shorten long pauses.
+
+    Returns an empty array when the clip has no speech in it.
+    """
+    if not VAD_ENABLED or len(audio) == 0:
+        return audio
+    voiced = speech_mask(audio)
+    if voiced.all():
+        return audio
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    return audio[np.repeat(voiced, frame)[:len(audio)]]